@@ -0,0 +1,49 @@
+import random
+
+
+class MapGenerator:
+    def __init__(self, seed: int = 0, fragile_probabilities: tuple = (0.1, 0.9)):
+        # Random grid maps in the input file format, the same seed always generates the same maps
+        self.rng = random.Random(seed)
+        self.fragile_probabilities = fragile_probabilities
+
+    @staticmethod
+    def _grid_edges(x: int, y: int):
+        edges = list()
+        for row in range(x + 1):
+            for col in range(y + 1):
+                if row < x:
+                    edges.append(((row, col), (row + 1, col)))
+                if col < y:
+                    edges.append(((row, col), (row, col + 1)))
+        return edges
+
+    def generate(self, x: int, y: int, blocked_count: int, fragile_count: int, deadline: int = None):
+        # 'x', 'y': maximum coordinates, the package goes from a random vertex to another one
+        edges = self._grid_edges(x=x, y=y)
+        if blocked_count + fragile_count > len(edges):
+            raise ValueError(f"A {x}x{y} grid has only {len(edges)} edges, got {blocked_count + fragile_count}")
+
+        vertices = [(row, col) for row in range(x + 1) for col in range(y + 1)]
+        if len(vertices) < 2:
+            raise ValueError("The grid must have at least 2 vertices")
+        start, goal = self.rng.sample(vertices, 2)
+        deadline = len(vertices) * (fragile_count + 1) if deadline is None else deadline
+
+        special_edges = self.rng.sample(edges, blocked_count + fragile_count)
+        lines = [
+            f"#X {x}                ; Maximum x coordinate",
+            f"#Y {y}                ; Maximum y coordinate",
+            f"#P {start[0]} {start[1]} 0  D {goal[0]} {goal[1]} {deadline}  ; Package at {start}, deliver to {goal}"
+        ]
+        for (first, second) in special_edges[:blocked_count]:
+            lines.append(f"#B {first[0]} {first[1]} {second[0]} {second[1]}          ; Always blocked")
+        for (first, second) in special_edges[blocked_count:]:
+            p = round(self.rng.uniform(*self.fragile_probabilities), 2)
+            lines.append(f"#F {first[0]} {first[1]} {second[0]} {second[1]} {p}      ; Fragile")
+        lines.append(f"#A {start[0]} {start[1]}              ; Normal agent starts at {start}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, data_filepath: str, **map_parameters):
+        with open(data_filepath, "w") as data_file:
+            data_file.write(self.generate(**map_parameters))
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from state import State
+from ascii_parser import Parser
+from utility_of_states import UtilityOfStates
+from simulator import Simulator
+from map_generator import MapGenerator
+
+
+class PhaseRecorder:
+    def __init__(self, solver_stats):
+        # Solver stats subscriber: the peak RSS of the process when each phase finishes,
+        # and the counters added between the start and the end of each phase
+        self.solver_stats = solver_stats
+        self.peak_rss_kb = dict()
+        self.phase_counters = dict()
+        self.started_counters = dict()
+
+    @staticmethod
+    def current():
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss // 1024 if sys.platform == "darwin" else peak_rss
+
+    def counters_since(self, started_counters: dict):
+        return {
+            counter_name: count - started_counters.get(counter_name, 0)
+            for counter_name, count in self.solver_stats.counters.items()
+            if count != started_counters.get(counter_name, 0)
+        }
+
+    def __call__(self, event_name: str, event_data: dict):
+        if event_name == "phase_started":
+            self.started_counters[event_data["phase_name"]] = dict(self.solver_stats.counters)
+        elif event_name == "phase_finished":
+            phase_name = event_data["phase_name"]
+            self.peak_rss_kb[phase_name] = self.current()
+            # A phase run more than once (e.g. several policy extractions) adds up
+            phase_counters = self.phase_counters.setdefault(phase_name, dict())
+            for counter_name, count in self.counters_since(self.started_counters.pop(phase_name)).items():
+                phase_counters[counter_name] = phase_counters.get(counter_name, 0) + count
+
+
+class BenchmarkRunner:
+    def __init__(self,
+                 maps_directory: str,
+                 simulations_count: int = 10,
+                 solver_mode: str = "sequential",
+                 solver_options: dict = None):
+        # Every case runs in a fresh process, so the peak RSS of a case is not hidden by earlier ones.
+        # The peak RSS of a phase is the peak of the case process up to the end of that phase
+        self.maps_directory = maps_directory
+        self.simulations_count = simulations_count
+        self.solver_mode = solver_mode
+        self.solver_options = dict() if solver_options is None else solver_options
+
+    @staticmethod
+    def _source_version():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def _graph_instance(initial_state: State, rng: random.Random):
+        # Every fragile edge is blocked with its probability, the unblocked ones are dropped
+        special_edges = list()
+        for special_edge in initial_state.special_edges:
+            if special_edge["type"] != "fragile":
+                special_edges.append(special_edge)
+            elif rng.random() < special_edge["p"]:
+                special_edges.append(dict(special_edge, type="always blocked"))
+        graph_instance = initial_state.clone_state()
+        graph_instance.set_special_edges(special_edges=special_edges)
+        return graph_instance
+
+    def run_case(self, case: dict):
+        data_filepath = os.path.join(
+            self.maps_directory,
+            f"map_{case['x']}x{case['y']}_b{case['blocked_count']}_f{case['fragile_count']}_s{case['seed']}.txt"
+        )
+        MapGenerator(seed=case["seed"]).write(
+            data_filepath=data_filepath,
+            x=case["x"],
+            y=case["y"],
+            blocked_count=case["blocked_count"],
+            fragile_count=case["fragile_count"]
+        )
+
+        initial_state = State(environment_data=Parser().parse_data(data_filepath=data_filepath))
+        initial_state.update_agent_packages_status()
+        utility_of_states = UtilityOfStates(initial_state=initial_state, show_progress=False)
+        phase_recorder = PhaseRecorder(solver_stats=utility_of_states.solver_stats)
+        utility_of_states.solver_stats.subscribe(phase_recorder)
+
+        # The solver phases (and the policy extraction) are timed by the solver stats
+        utility_of_states.preform_value_iteration(solver_mode=self.solver_mode, **self.solver_options)
+        with open(os.devnull, "w") as null_file:
+            utility_of_states.write_policy(output_file=null_file)
+        start_value, _ = utility_of_states.utility_value_and_action(
+            vertex_idx=utility_of_states.state.coordinates_to_vertex_index(
+                coords=utility_of_states.all_packages[0]["package_at"]
+            ),
+            unknown_state=utility_of_states.get_initial_unknown_state()
+        )
+        phases = {
+            phase_name: dict(
+                wall_time_s=seconds,
+                peak_rss_kb=phase_recorder.peak_rss_kb.get(phase_name, None),
+                counters=phase_recorder.phase_counters.get(phase_name, dict())
+            )
+            for phase_name, seconds in utility_of_states.solver_stats.phase_seconds.items()
+        }
+
+        # Seeded graph instances, the simulator output is discarded
+        phase_start = time.perf_counter()
+        started_counters = dict(utility_of_states.solver_stats.counters)
+        simulation_steps_count = 0
+        rng = random.Random(case["seed"])
+        with open(os.devnull, "w") as null_file, contextlib.redirect_stdout(null_file):
+            for _ in range(self.simulations_count):
+                simulator = Simulator(
+                    initial_state=self._graph_instance(initial_state=initial_state, rng=rng),
+                    utility_of_states=utility_of_states
+                )
+                simulator.run()
+                simulation_steps_count += int(simulator.current_state.time)
+        phases["simulation"] = dict(
+            wall_time_s=time.perf_counter() - phase_start,
+            peak_rss_kb=PhaseRecorder.current(),
+            counters=phase_recorder.counters_since(started_counters=started_counters),
+            simulations_count=self.simulations_count,
+            simulation_steps_count=simulation_steps_count
+        )
+
+        start_value = float(start_value)
+        return {
+            "case": case,
+            "vertices_count": utility_of_states.state.total_vertices,
+            "beliefs_count": utility_of_states.belief_codec.beliefs_count,
+            "expected_utility": start_value if math.isfinite(start_value) else None,
+            "phases": phases
+        }
+
+    def _run_case_process(self, case: dict, result_connection):
+        result_connection.send(self.run_case(case=case))
+        result_connection.close()
+
+    def _run_case_in_process(self, case: dict):
+        result_connection, case_connection = multiprocessing.Pipe(duplex=False)
+        case_process = multiprocessing.Process(target=self._run_case_process, args=(case, case_connection))
+        case_process.start()
+        case_connection.close()
+        try:
+            case_result = result_connection.recv()
+        except EOFError:
+            case_result = None
+        case_process.join()
+        if case_result is None:
+            raise ValueError(f"Benchmark case {case} failed (exit code {case_process.exitcode})")
+        return case_result
+
+    def run(self, cases: list, results_filepath: str):
+        # One JSON object per case and line, appended so results of several versions can share a file
+        os.makedirs(self.maps_directory, exist_ok=True)
+        run_info = {
+            "source_version": self._source_version(),
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "solver_mode": self.solver_mode,
+            "solver_options": self.solver_options
+        }
+        with open(results_filepath, "a") as results_file:
+            for case in cases:
+                case_result = self._run_case_in_process(case=case)
+                results_file.write(json.dumps(dict(run_info, **case_result)) + "\n")
+                results_file.flush()
+                print(
+                    f"{case_result['case']}: " + ", ".join(
+                        f"{phase_name} {phase['wall_time_s']:.3f}s"
+                        for phase_name, phase in case_result["phases"].items()
+                    )
+                )
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Solver scaling benchmarks on generated maps")
+    argument_parser.add_argument("--sizes", nargs="+", default=["4x4", "8x8", "12x12"],
+                                 help="Grid sizes as 'XxY' maximum coordinates")
+    argument_parser.add_argument("--blocked", nargs="+", type=int, default=[4], help="Blocked edges counts")
+    argument_parser.add_argument("--fragile", nargs="+", type=int, default=[2, 4, 6], help="Fragile edges counts")
+    argument_parser.add_argument("--seeds", nargs="+", type=int, default=[0], help="Map generator seeds")
+    argument_parser.add_argument("--simulations", type=int, default=10, help="Simulator runs per case")
+    argument_parser.add_argument("--solver-mode", default="sequential",
+                                 help="Solver mode: sequential, parallel, lazy, prioritized or rtdp")
+    argument_parser.add_argument("--solver-options", type=json.loads, default=dict(),
+                                 help="Solver options as JSON, e.g. '{\"workers_count\": 4}'")
+    argument_parser.add_argument("--maps-directory", default="benchmark_maps", help="Where generated maps are kept")
+    argument_parser.add_argument("--output", default="benchmark_results.jsonl", help="Results file (JSON lines)")
+    arguments = argument_parser.parse_args()
+
+    cases = [
+        {
+            "x": int(size.lower().split("x")[0]),
+            "y": int(size.lower().split("x")[1]),
+            "blocked_count": blocked_count,
+            "fragile_count": fragile_count,
+            "seed": seed
+        }
+        for size in arguments.sizes
+        for blocked_count in arguments.blocked
+        for fragile_count in arguments.fragile
+        for seed in arguments.seeds
+    ]
+    benchmark_runner = BenchmarkRunner(
+        maps_directory=arguments.maps_directory,
+        simulations_count=arguments.simulations,
+        solver_mode=arguments.solver_mode,
+        solver_options=arguments.solver_options
+    )
+    benchmark_runner.run(cases=cases, results_filepath=arguments.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from belief_codec import BeliefCodec
+
+
+class ActionTable:
+    def __init__(self,
+                 vertices_count: int,
+                 belief_codec: BeliefCodec,
+                 edge_endpoints: list,
+                 codes: np.ndarray = None,
+                 codes_allocator=None):
+        # Action code of every (vertex, belief state) pair, each belief state stores its vertices contiguously
+        # (position 'belief_idx * vertices_count + vertex_idx'), so a lookup is a single read.
+        # The observation inconsistent pairs have no action: standing on an end of an unknown edge reveals it,
+        # so a vertex with an unknown incident edge never acts under that belief state
+        self.vertices_count = vertices_count
+        self.belief_codec = belief_codec
+        self.edge_endpoints = edge_endpoints
+        self.codes_count = vertices_count * belief_codec.beliefs_count
+
+        # Unknown edges ending at each vertex
+        self.incident_edges = np.zeros(shape=(vertices_count, belief_codec.edges_count), dtype=bool)
+        for edge_idx, edge in enumerate(edge_endpoints):
+            for vertex_idx in edge:
+                self.incident_edges[vertex_idx, edge_idx] = True
+        self.edge_weights = np.array(belief_codec.edge_weights, dtype=np.int64)
+
+        # New codes come from 'codes_allocator' (codes count -> array filled with '-1'), in memory by default
+        if codes is None and codes_allocator is not None:
+            codes = codes_allocator(self.codes_count)
+        elif codes is None:
+            codes = np.full(shape=self.codes_count, fill_value=-1, dtype=np.int8)
+        if codes.shape != (self.codes_count,):
+            raise ValueError(f"Action codes must have shape '{(self.codes_count,)}', got '{codes.shape}'")
+        self.codes = codes
+
+    def _inconsistent(self, vertex_indices: np.ndarray, belief_indices: np.ndarray):
+        # Whether the vertex of each pair ends an edge that is unknown in its belief state
+        edge_digits = (belief_indices[..., None] // self.edge_weights) % len(self.belief_codec.edge_states)
+        unknown_edges = edge_digits == self.belief_codec.edge_state_digits["U"]
+        return (unknown_edges & self.incident_edges[vertex_indices]).any(axis=-1)
+
+    def positions(self, vertex_indices, belief_indices):
+        return np.asarray(belief_indices, dtype=np.int64) * self.vertices_count + vertex_indices
+
+    def store(self, vertex_indices, belief_indices, action_codes):
+        # Inconsistent pairs are dropped
+        vertex_indices, belief_indices = np.broadcast_arrays(
+            np.asarray(vertex_indices, dtype=np.int64),
+            np.asarray(belief_indices, dtype=np.int64)
+        )
+        action_codes = np.broadcast_to(np.asarray(action_codes, dtype=np.int8), vertex_indices.shape)
+        consistent = ~self._inconsistent(vertex_indices=vertex_indices, belief_indices=belief_indices)
+        positions = self.positions(vertex_indices=vertex_indices, belief_indices=belief_indices)
+        self.codes[positions[consistent]] = action_codes[consistent]
+
+    def fetch(self, vertex_indices, belief_indices):
+        # Inconsistent pairs were never stored, so they have no action ('-1')
+        return self.codes[self.positions(vertex_indices=vertex_indices, belief_indices=belief_indices)]
+
+    def copy_belief(self, source_belief_idx: int, target_belief_idx: int):
+        vertex_indices = np.arange(self.vertices_count)
+        self.store(
+            vertex_indices=vertex_indices,
+            belief_indices=target_belief_idx,
+            action_codes=self.fetch(vertex_indices=vertex_indices, belief_indices=source_belief_idx)
+        )
@@ -0,0 +1,337 @@
+import numpy as np
+
+from belief_codec import BeliefCodec
+from action_table import ActionTable
+from transition_model import TransitionModel
+
+
+class BackupEngine:
+    def __init__(self,
+                 transition_model: TransitionModel,
+                 goal_idx: int,
+                 belief_codec: BeliefCodec,
+                 utility_values: np.ndarray,
+                 utility_actions: ActionTable,
+                 known_batch_size: int = 64):
+        # Reads only the precompiled transition tables, moves ordered as Down, Up, Right, Left.
+        # Per move arrays are move-major: (moves, vertices)
+        self.transition_model = transition_model
+        self.goal_idx = goal_idx
+        self.belief_codec = belief_codec
+        self.utility_values = utility_values
+        self.utility_actions = utility_actions
+        self.known_batch_size = known_batch_size
+        self.moves_count = transition_model.moves_count
+
+        self.goal_mask = np.zeros(shape=transition_model.vertices_count, dtype=bool)
+        self.goal_mask[goal_idx] = True
+        self.non_goal_indices = np.nonzero(~self.goal_mask)[0]
+        self.never_settled = np.iinfo(np.int64).max // 2
+
+        # Sweep in which each vertex settled, per known belief state of the last solved layer (the next layer
+        # reuses the results of its parents)
+        self.known_settle_sweeps = dict()
+
+        # Per vertex (move, neighbor) pairs of the moves leading into it, built on the first repair
+        self.predecessor_moves = None
+
+        # Work counters: (vertex, belief state) backups evaluated, backups that improved the value,
+        # belief states copied from a solved parent
+        self.backups_count = 0
+        self.improvements_count = 0
+        self.copied_beliefs_count = 0
+
+    def _edge_states(self, belief_idx: int):
+        # Per (move, vertex) edge state digits, normal edges act as unblocked ('F')
+        unblocked_digit = self.belief_codec.edge_state_digits["F"]
+        belief_digits = [self.belief_codec.edge_state_digits[s] for s in self.belief_codec.decode(belief_idx)]
+        edge_digits = np.array(belief_digits + [unblocked_digit], dtype=np.int64)
+        return edge_digits[self.transition_model.move_fragile_ids]
+
+    def _unblocked_open(self, edge_states: np.ndarray):
+        return self.transition_model.move_edge_open & (edge_states == self.belief_codec.edge_state_digits["F"])
+
+    def _unknown_edge_values(self, belief_idx: int, edge_states: np.ndarray, unblocked_open: np.ndarray):
+        # Expected successor value of every move over an unknown edge (-inf if not applicable)
+        model = self.transition_model
+        unknown_values = np.full(shape=model.move_successors.shape, fill_value=-np.inf)
+        unknown_open = model.move_edge_open & (edge_states == self.belief_codec.edge_state_digits["U"])
+        if not unknown_open.any():
+            return unknown_values
+
+        moves, vertices = np.nonzero(unknown_open)
+        fragile_ids = model.fragile_ids[vertices, moves]
+        edge_weights = np.array(self.belief_codec.edge_weights, dtype=np.int64)[fragile_ids]
+        belief_t = belief_idx + (
+            (self.belief_codec.edge_state_digits["T"] - self.belief_codec.edge_state_digits["U"]) * edge_weights
+        )
+        belief_f = belief_idx + (
+            (self.belief_codec.edge_state_digits["F"] - self.belief_codec.edge_state_digits["U"]) * edge_weights
+        )
+
+        # Edge is blocked: best alternative unblocked move under the blocked belief
+        alternative_moves = model.alternative_moves[moves]
+        alternative_open = unblocked_open[alternative_moves, vertices[:, None]]
+        alternative_vertices = model.alternative_successors[vertices, moves]
+        alternative_values = np.where(
+            alternative_open,
+            self.utility_values[np.where(alternative_open, alternative_vertices, 0), belief_t[:, None]],
+            -np.inf
+        ).max(axis=1)
+        has_alternative = alternative_open.any(axis=1)
+
+        # Edge is unblocked
+        values_f = self.utility_values[model.successors[vertices, moves], belief_f]
+
+        p = model.fragile_probabilities[fragile_ids]
+        q = 1 - p
+        with np.errstate(invalid="ignore"):
+            expected_values = (-model.costs[vertices, moves]) + (p * alternative_values + q * values_f)
+        expected_values[~has_alternative | np.isnan(expected_values)] = -np.inf
+        unknown_values[moves, vertices] = expected_values
+        return unknown_values
+
+    def _move_values(self, values: np.ndarray, unblocked_open: np.ndarray, unknown_values: np.ndarray):
+        model = self.transition_model
+        successor_values = model.gather(values=values, successors=model.move_successors, fill_value=-np.inf)
+        return np.where(unblocked_open, (-model.move_costs) + successor_values, unknown_values)
+
+    def _sweep_actions(self, values: np.ndarray, move_values: np.ndarray, unblocked_open: np.ndarray):
+        # Reproduce the action the in-place row-major sweep settles on when several moves tie:
+        # the first move (in moves order) whose successor already held its final value
+        model = self.transition_model
+        optimal_moves = (move_values == values) & (np.isfinite(values) & ~self.goal_mask)
+        settle_sweeps = np.full(shape=values.shape, fill_value=self.never_settled, dtype=np.int64)
+        settle_sweeps[self.goal_mask] = 0
+
+        while True:
+            move_sweeps = np.where(
+                unblocked_open,
+                model.gather(values=settle_sweeps, successors=model.move_successors, fill_value=self.never_settled) +
+                model.move_successor_after,
+                0
+            )
+            earliest_sweeps = np.where(optimal_moves, move_sweeps, self.never_settled).min(axis=0)
+            new_settle_sweeps = np.where(optimal_moves.any(axis=0), np.maximum(earliest_sweeps, 1), settle_sweeps)
+            if np.array_equal(new_settle_sweeps, settle_sweeps):
+                break
+            settle_sweeps = new_settle_sweeps
+
+        actions = np.full(shape=values.shape, fill_value=-1, dtype=np.int8)
+        for move_idx in reversed(range(self.moves_count)):
+            chosen_moves = optimal_moves[move_idx] & (move_sweeps[move_idx] <= settle_sweeps)
+            actions[chosen_moves] = move_idx
+        return actions
+
+    def _belief_moves(self, belief_idx: int):
+        edge_states = self._edge_states(belief_idx=belief_idx)
+        unblocked_open = self._unblocked_open(edge_states=edge_states)
+        unknown_values = self._unknown_edge_values(
+            belief_idx=belief_idx,
+            edge_states=edge_states,
+            unblocked_open=unblocked_open
+        )
+        return unblocked_open, unknown_values
+
+    def solve_belief(self, belief_idx: int):
+        unblocked_open, unknown_values = self._belief_moves(belief_idx=belief_idx)
+        return self._solve_from(
+            belief_idx=belief_idx,
+            values=np.array(self.utility_values[:, belief_idx]),
+            unblocked_open=unblocked_open,
+            unknown_values=unknown_values
+        )
+
+    def repair_belief(self, belief_idx: int):
+        # Solves a belief state again after a map change, starting from its previous values: a vertex keeps its
+        # value while some move still reaches it through vertices that keep theirs, the others (found walking the
+        # previous optimal moves backwards) start over. Returns the sweeps count and whether any value changed
+        unblocked_open, unknown_values = self._belief_moves(belief_idx=belief_idx)
+        previous_values = np.array(self.utility_values[:, belief_idx])
+        move_values = self._move_values(values=previous_values, unblocked_open=unblocked_open,
+                                        unknown_values=unknown_values)
+        supporting_moves = (move_values >= previous_values) & (np.isfinite(previous_values) & ~self.goal_mask)
+        support_counts = supporting_moves.sum(axis=0)
+
+        if self.predecessor_moves is None:
+            successors = self.transition_model.successors.tolist()
+            self.predecessor_moves = [
+                [
+                    (successors[predecessor_idx].index(vertex_idx), predecessor_idx)
+                    for predecessor_idx in successors[vertex_idx] if predecessor_idx >= 0
+                ]
+                for vertex_idx in range(self.transition_model.vertices_count)
+            ]
+
+        values = previous_values.copy()
+        unsupported = np.nonzero(np.isfinite(previous_values) & ~self.goal_mask & (support_counts == 0))[0].tolist()
+        while len(unsupported) > 0:
+            vertex_idx = unsupported.pop()
+            values[vertex_idx] = -np.inf
+            for move_idx, predecessor_idx in self.predecessor_moves[vertex_idx]:
+                if supporting_moves[move_idx, predecessor_idx] and unblocked_open[move_idx, predecessor_idx]:
+                    supporting_moves[move_idx, predecessor_idx] = False
+                    support_counts[predecessor_idx] -= 1
+                    if support_counts[predecessor_idx] == 0:
+                        unsupported.append(predecessor_idx)
+
+        sweeps_count = self._solve_from(
+            belief_idx=belief_idx,
+            values=values,
+            unblocked_open=unblocked_open,
+            unknown_values=unknown_values
+        )
+        return sweeps_count, not np.array_equal(self.utility_values[:, belief_idx], previous_values)
+
+    def _solve_from(self, belief_idx: int, values: np.ndarray, unblocked_open: np.ndarray, unknown_values: np.ndarray):
+        # Jacobi fixed point over the whole grid, from values that are lower bounds of the solution
+        sweeps_count = 0
+        while True:
+            move_values = self._move_values(values=values, unblocked_open=unblocked_open, unknown_values=unknown_values)
+            new_values = np.maximum(values, move_values.max(axis=0))
+            sweeps_count += 1
+            self.backups_count += values.shape[0]
+            self.improvements_count += int(np.count_nonzero(new_values > values))
+            if np.array_equal(new_values, values):
+                break
+            values = new_values
+
+        actions = self._sweep_actions(values=values, move_values=move_values, unblocked_open=unblocked_open)
+        self.utility_values[:, belief_idx] = values
+        self.utility_actions.store(
+            vertex_indices=self.non_goal_indices,
+            belief_indices=belief_idx,
+            action_codes=actions[self.non_goal_indices]
+        )
+        return sweeps_count
+
+    def _edge_state_digit(self, belief_idx: int, vertex_idx: int, move_idx: int):
+        fragile_idx = self.transition_model.fragile_ids[vertex_idx, move_idx]
+        if fragile_idx < 0:
+            return self.belief_codec.edge_state_digits["F"]
+        return (belief_idx // self.belief_codec.edge_weights[fragile_idx]) % len(self.belief_codec.edge_states)
+
+    def _blocking_keeps_solution(self, parent_idx: int, edge_idx: int):
+        # Blocking the edge changes nothing if its far end neither moves over it nor settles later without it
+        model = self.transition_model
+        first_vertex, second_vertex = model.fragile_endpoints[edge_idx]
+        if first_vertex < 0:
+            return True
+
+        first_value = self.utility_values[first_vertex, parent_idx]
+        second_value = self.utility_values[second_vertex, parent_idx]
+        if not (np.isfinite(first_value) and np.isfinite(second_value)):
+            return True
+
+        edge_end = 0 if first_value < second_value else 1
+        far_vertex = model.fragile_endpoints[edge_idx, edge_end]
+        edge_move_idx = model.fragile_moves[edge_idx, edge_end]
+        if self.utility_actions.fetch(vertex_indices=far_vertex, belief_indices=parent_idx) == edge_move_idx:
+            return False
+
+        parent_sweeps = self.known_settle_sweeps[parent_idx]
+        earliest_sweep = None
+        for move_idx in range(self.moves_count):
+            if move_idx == edge_move_idx or not model.edge_open[far_vertex, move_idx]:
+                continue
+            if self._edge_state_digit(parent_idx, far_vertex, move_idx) != self.belief_codec.edge_state_digits["F"]:
+                continue
+
+            successor_idx = model.successors[far_vertex, move_idx]
+            optimal_move = (
+                self.utility_values[successor_idx, parent_idx] - model.costs[far_vertex, move_idx] ==
+                self.utility_values[far_vertex, parent_idx]
+            )
+            if optimal_move:
+                move_sweep = parent_sweeps[successor_idx] + model.successor_after[far_vertex, move_idx]
+                earliest_sweep = move_sweep if earliest_sweep is None else min(earliest_sweep, move_sweep)
+
+        return earliest_sweep is not None and max(earliest_sweep, 1) == parent_sweeps[far_vertex]
+
+    def unaffected_parent(self, belief_idx: int):
+        # A known belief equals a parent (one blocked edge unblocked) whose shortest path DAG and
+        # sweep tie breaking do not depend on that edge
+        blocked_digit = self.belief_codec.edge_state_digits["T"]
+        unblocked_digit = self.belief_codec.edge_state_digits["F"]
+        for edge_idx, edge_weight in enumerate(self.belief_codec.edge_weights):
+            if (belief_idx // edge_weight) % len(self.belief_codec.edge_states) != blocked_digit:
+                continue
+
+            parent_idx = belief_idx + (unblocked_digit - blocked_digit) * edge_weight
+            if self._blocking_keeps_solution(parent_idx=parent_idx, edge_idx=edge_idx):
+                return parent_idx
+
+        return None
+
+    def copy_belief(self, source_belief_idx: int, target_belief_idx: int):
+        self.utility_values[:, target_belief_idx] = self.utility_values[:, source_belief_idx]
+        self.utility_actions.copy_belief(source_belief_idx=source_belief_idx, target_belief_idx=target_belief_idx)
+        self.copied_beliefs_count += 1
+        if source_belief_idx in self.known_settle_sweeps:
+            self.known_settle_sweeps[target_belief_idx] = self.known_settle_sweeps[source_belief_idx]
+
+    def keep_settle_sweeps(self, belief_indices: list):
+        # Only the next known layer reads the settle sweeps (of its parents), the older ones are dropped
+        self.known_settle_sweeps = {belief_idx: self.known_settle_sweeps[belief_idx] for belief_idx in belief_indices}
+
+    def solve_known_beliefs(self, belief_indices: list):
+        for batch_start in range(0, len(belief_indices), self.known_batch_size):
+            self._solve_known_batch(belief_indices=belief_indices[batch_start:batch_start + self.known_batch_size])
+
+    def _solve_known_batch(self, belief_indices: list):
+        # Belief states without unknown edges are a unit-cost grid: one reverse BFS from the goal,
+        # with the frontiers of all the belief states in the batch advanced together
+        if len(belief_indices) == 0:
+            return
+
+        model = self.transition_model
+        batch_shape = (len(belief_indices), model.vertices_count)
+        unblocked_open = np.stack([
+            self._unblocked_open(edge_states=self._edge_states(belief_idx=belief_idx))
+            for belief_idx in belief_indices
+        ])
+
+        distances = np.full(shape=batch_shape, fill_value=-1, dtype=np.int64)
+        distances[:, self.goal_mask] = 0
+        settle_sweeps = np.full(shape=batch_shape, fill_value=self.never_settled, dtype=np.int64)
+        settle_sweeps[:, self.goal_mask] = 0
+        actions = np.full(shape=batch_shape, fill_value=-1, dtype=np.int8)
+
+        frontier = np.broadcast_to(self.goal_mask, batch_shape)
+        distance = 0
+        while frontier.any():
+            distance += 1
+            unvisited = distances < 0
+
+            # Moves from unvisited vertices into the current frontier are exactly the optimal moves
+            optimal_moves = (
+                unblocked_open &
+                model.gather(values=frontier, successors=model.move_successors, fill_value=False) &
+                unvisited[:, None, :]
+            )
+            move_sweeps = (
+                model.gather(values=settle_sweeps, successors=model.move_successors, fill_value=self.never_settled) +
+                model.move_successor_after
+            )
+            frontier = optimal_moves.any(axis=1)
+            self.backups_count += batch_shape[0] * batch_shape[1]
+            self.improvements_count += int(np.count_nonzero(frontier))
+
+            # Same tie breaking as '_sweep_actions', one BFS layer at a time
+            earliest_sweeps = np.where(optimal_moves, move_sweeps, self.never_settled).min(axis=1)
+            settle_sweeps[frontier] = np.maximum(earliest_sweeps, 1)[frontier]
+            for move_idx in reversed(range(self.moves_count)):
+                chosen_moves = optimal_moves[:, move_idx] & (move_sweeps[:, move_idx] <= settle_sweeps)
+                actions[chosen_moves] = move_idx
+            distances[frontier] = distance
+
+        for batch_idx, belief_idx in enumerate(belief_indices):
+            self.known_settle_sweeps[belief_idx] = settle_sweeps[batch_idx]
+
+        values = np.where(distances >= 0, (-distances).astype(np.float64), -np.inf)
+        self.utility_values[:, belief_indices] = values.T
+        self.utility_actions.store(
+            vertex_indices=self.non_goal_indices[None, :],
+            belief_indices=np.array(belief_indices, dtype=np.int64)[:, None],
+            action_codes=actions[:, self.non_goal_indices]
+        )
@@ -0,0 +1,112 @@
+import itertools
+import numpy as np
+
+
+class BeliefCodec:
+    def __init__(self, edges_count: int):
+        # Digits order matches the order of 'itertools.product' over the edge states
+        self.edge_states = ["T", "F", "U"]
+        self.edges_count = edges_count
+        self.beliefs_count = len(self.edge_states) ** edges_count
+        self.edge_state_digits = {edge_state: digit for digit, edge_state in enumerate(self.edge_states)}
+
+        # The first edge is the most significant digit
+        self.edge_weights = [len(self.edge_states) ** (edges_count - 1 - idx) for idx in range(edges_count)]
+
+        # Wildcards: X in [T,F,U], K in [T,F]
+        self.pattern_digits = {
+            "T": [0],
+            "F": [1],
+            "U": [2],
+            "X": [0, 1, 2],
+            "K": [0, 1]
+        }
+        self.matching_indices_cache = dict()
+
+    def encode(self, unknown_state: list) -> int:
+        if len(unknown_state) != self.edges_count:
+            raise ValueError(f"Unknown state '{unknown_state}' must have {self.edges_count} edges")
+
+        belief_idx = 0
+        for edge_state in unknown_state:
+            digit = self.edge_state_digits.get(edge_state, None)
+            if digit is None:
+                raise ValueError(f"Invalid edge state '{edge_state}' in unknown state '{unknown_state}'")
+            belief_idx = belief_idx * len(self.edge_states) + digit
+        return belief_idx
+
+    def decode(self, belief_idx: int) -> list:
+        if belief_idx < 0 or belief_idx >= self.beliefs_count:
+            raise ValueError("Belief index out of bounds")
+
+        unknown_state = list()
+        for edge_weight in self.edge_weights:
+            digit = (belief_idx // edge_weight) % len(self.edge_states)
+            unknown_state.append(self.edge_states[digit])
+        return unknown_state
+
+    def is_concrete(self, unknown_state: list) -> bool:
+        return all(edge_state in self.edge_state_digits for edge_state in unknown_state)
+
+    def matching_indices(self, unknown_state: list) -> np.ndarray:
+        # Sorted indices of all the belief states matching a (possibly wildcard) pattern
+        pattern_key = tuple(unknown_state)
+        belief_indices = self.matching_indices_cache.get(pattern_key, None)
+        if belief_indices is not None:
+            return belief_indices
+
+        if len(unknown_state) != self.edges_count:
+            raise ValueError(f"Unknown state '{unknown_state}' must have {self.edges_count} edges")
+
+        belief_indices = np.zeros(shape=1, dtype=np.int64)
+        for edge_state in unknown_state:
+            digits = self.pattern_digits.get(edge_state, None)
+            if digits is None:
+                raise ValueError(f"Invalid edge state '{edge_state}' in unknown state '{unknown_state}'")
+            belief_indices = (belief_indices[:, None] * len(self.edge_states) + np.array(digits)[None, :]).ravel()
+
+        belief_indices.setflags(write=False)
+        self.matching_indices_cache[pattern_key] = belief_indices
+        return belief_indices
+
+    def matches_pattern(self, unknown_state: list, pattern: list) -> bool:
+        if len(pattern) != self.edges_count:
+            raise ValueError(f"Pattern '{pattern}' must have {self.edges_count} edges")
+
+        for edge_state, pattern_state in zip(unknown_state, pattern):
+            digits = self.pattern_digits.get(pattern_state, None)
+            if digits is None:
+                raise ValueError(f"Invalid edge state '{pattern_state}' in pattern '{pattern}'")
+            if self.edge_state_digits[edge_state] not in digits:
+                return False
+        return True
+
+    def first_matching_index(self, unknown_state: list) -> int:
+        if self.is_concrete(unknown_state=unknown_state):
+            return self.encode(unknown_state=unknown_state)
+        return int(self.matching_indices(unknown_state=unknown_state)[0])
+
+    def edge_state(self, belief_idx: int, edge_idx: int) -> str:
+        digit = (belief_idx // self.edge_weights[edge_idx]) % len(self.edge_states)
+        return self.edge_states[digit]
+
+    def replace_edge_state(self, belief_idx: int, edge_idx: int, edge_state: str) -> int:
+        current_digit = (belief_idx // self.edge_weights[edge_idx]) % len(self.edge_states)
+        new_digit = self.edge_state_digits[edge_state]
+        return belief_idx + (new_digit - current_digit) * self.edge_weights[edge_idx]
+
+    def layer_indices(self, edge_states: list, layer_edge_state: str, layer_count: int) -> np.ndarray:
+        # Sorted indices of the belief states over 'edge_states' with 'layer_count' edges in 'layer_edge_state',
+        # built per choice of those edges without going over the other layers
+        layer_digits = np.array([self.edge_state_digits[layer_edge_state]])
+        other_digits = np.array([
+            self.edge_state_digits[edge_state] for edge_state in edge_states if edge_state != layer_edge_state
+        ])
+        layer_blocks = list()
+        for layer_edges in itertools.combinations(range(self.edges_count), layer_count):
+            belief_indices = np.zeros(shape=1, dtype=np.int64)
+            for edge_idx in range(self.edges_count):
+                digits = layer_digits if edge_idx in layer_edges else other_digits
+                belief_indices = (belief_indices[:, None] * len(self.edge_states) + digits[None, :]).ravel()
+            layer_blocks.append(belief_indices)
+        return np.sort(np.concatenate(layer_blocks))
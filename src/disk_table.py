@@ -0,0 +1,48 @@
+import os
+import mmap
+import numpy as np
+
+
+class DiskTable:
+    def __init__(self,
+                 path: str,
+                 shape: tuple,
+                 dtype,
+                 order: str = "C",
+                 fill_value=None,
+                 chunk_bytes: int = 1 << 23):
+        # Table stored in a file on local disk and mapped into memory, only the touched pages are resident
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.order = order
+        self.chunk_bytes = chunk_bytes
+        self.size = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        if fill_value is not None:
+            with open(path, "wb") as table_file:
+                table_file.truncate(self.size)
+
+        with open(path, "r+b") as table_file:
+            if os.fstat(table_file.fileno()).st_size != self.size:
+                raise ValueError(f"Table file '{path}' must have {self.size} bytes")
+            # The mapping keeps its own reference to the file
+            self.mapping = mmap.mmap(table_file.fileno(), self.size)
+
+        self.array = np.ndarray(shape=self.shape, dtype=self.dtype, buffer=self.mapping, order=self.order)
+        if fill_value is not None:
+            self.fill(fill_value=fill_value)
+
+    def fill(self, fill_value):
+        # Chunk by chunk, so filling never holds the whole table in memory
+        flat_array = np.ndarray(shape=int(np.prod(self.shape)), dtype=self.dtype, buffer=self.mapping)
+        chunk_size = max(self.chunk_bytes // self.dtype.itemsize, 1)
+        for chunk_start in range(0, flat_array.shape[0], chunk_size):
+            flat_array[chunk_start:chunk_start + chunk_size] = fill_value
+            self.release()
+
+    def release(self):
+        # Write the dirty pages back and drop the resident ones, they are read back from disk on demand
+        self.mapping.flush()
+        if hasattr(mmap, "MADV_DONTNEED"):
+            self.mapping.madvise(mmap.MADV_DONTNEED)
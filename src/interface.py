@@ -1,8 +1,10 @@
 from state import State
 from utility_of_states import UtilityOfStates
 from simulator import Simulator
+from policy_evaluation import PolicyEvaluator
 
-from random import choices
+import sys
+from random import choices, randrange
 
 
 class Interface:
@@ -15,16 +17,18 @@ class Interface:
             "1": self._print_constructed_policy,
             "2": self._generate_new_graph_instance,
             "3": self._run_simulator,
-            "4": self._quit
+            "4": self._evaluate_policy,
+            "5": self._quit
         }
 
     def _print_belief_states_values(self):
-        results = self.utility_of_states.belief_states_values()
-        print(results)
+        # Streamed, the report of a large map is never held in memory
+        self.utility_of_states.write_belief_states_values(output_file=sys.stdout)
+        print()
 
     def _print_constructed_policy(self):
-        results = self.utility_of_states.find_policy()
-        print(results)
+        self.utility_of_states.write_policy(output_file=sys.stdout)
+        print()
 
     def _generate_new_graph_instance(self):
         graph_instance_str = "Generating new graph instance...\n"
@@ -34,6 +38,7 @@ class Interface:
         updated_special_edges = list()
         for special_edge in self.graph_instance.special_edges:
             if special_edge["type"] == "fragile":
+                special_edge = dict(special_edge)
                 p = special_edge["p"]
                 population = [True, False]
                 weights = [p, 1-p]
@@ -48,7 +53,7 @@ class Interface:
             else:
                 updated_special_edges.append(special_edge)
 
-        self.graph_instance.special_edges = updated_special_edges
+        self.graph_instance.set_special_edges(special_edges=updated_special_edges)
         graph_instance_str += (
             f"Graph instance generated!\n\n"
             f"Graph Instance State:\n"
@@ -63,6 +68,24 @@ class Interface:
             simulator = Simulator(initial_state=self.graph_instance, utility_of_states=self.utility_of_states)
             simulator.run()
 
+    def _evaluate_policy(self):
+        episodes_count = input("Number of sampled graph instances: ")
+        if not episodes_count.isdigit() or int(episodes_count) == 0:
+            print(f"Invalid number of sampled graph instances: {episodes_count}!\n")
+            return
+
+        # The seed is printed with the report, so an evaluation can be repeated
+        seed = input("Seed (leave empty for a random seed): ")
+        if seed == "":
+            seed = str(randrange(2 ** 32))
+        elif not seed.isdigit():
+            print(f"Invalid seed: {seed}!\n")
+            return
+
+        policy_evaluator = PolicyEvaluator(utility_of_states=self.utility_of_states, seed=int(seed))
+        print(f"Seed: {seed}")
+        print(policy_evaluator.evaluation_report(episodes_count=int(episodes_count)))
+
     @staticmethod
     def _quit():
         exit()
@@ -74,7 +97,8 @@ class Interface:
             "1. Print the constructed policy.\n"
             "2. Generate new graph instance.\n"
             "3. Run simulator (Prerequisite: a graph instance must exists).\n"
-            "4. Quit.\n"
+            "4. Evaluate the policy on sampled graph instances.\n"
+            "5. Quit.\n"
             "Your choice: "
         )
 
@@ -84,4 +108,4 @@ class Interface:
             if user_action is not None:
                 user_action()
             else:
-                print(f"Invalid input: {user_input}! Write either '0','1','2', '3' or '4'.\n")
+                print(f"Invalid input: {user_input}! Write either '0','1','2', '3', '4' or '5'.\n")
@@ -0,0 +1,237 @@
+import heapq
+import math
+import numpy as np
+
+from belief_codec import BeliefCodec
+from transition_model import TransitionModel
+
+
+class BeliefSlice:
+    def __init__(self, belief_idx: int, unblocked_open: list, vertices_count: int):
+        # Resumable search state of a single belief state over all the vertices
+        self.belief_idx = belief_idx
+        self.unblocked_open = unblocked_open
+        self.values = [-math.inf] * vertices_count
+        self.settled = [False] * vertices_count
+        self.settle_sweeps = [0] * vertices_count
+        self.actions = [-1] * vertices_count
+        self.exit_values = dict()
+
+        # Entries: (-value, kind, sequence, vertex, move), an exit bound pops before an exact value on ties
+        self.frontier = list()
+        self.sequence = 0
+
+    def push(self, value: float, kind: int, vertex_idx: int, move_idx: int):
+        heapq.heappush(self.frontier, (-value, kind, self.sequence, vertex_idx, move_idx))
+        self.sequence += 1
+
+
+class LazySolver:
+    def __init__(self,
+                 transition_model: TransitionModel,
+                 goal_idx: int,
+                 belief_codec: BeliefCodec,
+                 goal_action_code: int):
+        # Solves (vertex, belief state) pairs on demand: each belief state is a backward search from the goal
+        # that stops as soon as the queried vertex settles. Moves over unknown edges are exits whose values
+        # are point queries into the belief states with that edge revealed, evaluated only once their
+        # optimistic bound reaches the top of the search frontier
+        self.transition_model = transition_model
+        self.goal_idx = goal_idx
+        self.belief_codec = belief_codec
+        self.goal_action_code = goal_action_code
+        self.moves_count = transition_model.moves_count
+        self.exit_bound_kind = 0
+        self.exact_kind = 1
+
+        self.successors = transition_model.successors.tolist()
+        self.costs = transition_model.costs.tolist()
+        self.fragile_ids = transition_model.fragile_ids.tolist()
+        self.fragile_probabilities = transition_model.fragile_probabilities.tolist()
+        self.alternative_moves = transition_model.alternative_moves.tolist()
+
+        # Move of each neighbor back into the vertex ('-1' without a neighbor)
+        self.predecessor_moves = [
+            [
+                self.successors[predecessor_idx].index(vertex_idx) if predecessor_idx >= 0 else -1
+                for predecessor_idx in self.successors[vertex_idx]
+            ]
+            for vertex_idx in range(transition_model.vertices_count)
+        ]
+
+        # Upper bound of every value under any belief state: all the fragile edges unblocked
+        self.bound_values = self._all_unblocked_values()
+
+        self.slices = dict()
+        self.settled_count = 0
+        self.evaluated_exits_count = 0
+        self.relaxations_count = 0
+
+    def _all_unblocked_values(self):
+        bound_values = [-math.inf] * self.transition_model.vertices_count
+        frontier = [(0.0, self.goal_idx)]
+        while len(frontier) > 0:
+            distance, vertex_idx = heapq.heappop(frontier)
+            if bound_values[vertex_idx] != -math.inf:
+                continue
+
+            bound_values[vertex_idx] = -distance
+            for move_idx, predecessor_idx in enumerate(self.successors[vertex_idx]):
+                if predecessor_idx >= 0 and bound_values[predecessor_idx] == -math.inf:
+                    heapq.heappush(frontier, (distance + self.costs[vertex_idx][move_idx], predecessor_idx))
+        return bound_values
+
+    def _unblocked_open(self, belief_idx: int):
+        unblocked_digit = self.belief_codec.edge_state_digits["F"]
+        belief_digits = [self.belief_codec.edge_state_digits[s] for s in self.belief_codec.decode(belief_idx)]
+        edge_digits = np.array(belief_digits + [unblocked_digit], dtype=np.int64)
+        edge_states = edge_digits[self.transition_model.fragile_ids]
+        return (self.transition_model.edge_open & (edge_states == unblocked_digit)).tolist()
+
+    def _exit_value(self, belief_slice: BeliefSlice, vertex_idx: int, move_idx: int, lookup):
+        # Same expectation as the backups: the best alternative move if the edge is blocked,
+        # the move itself if it is unblocked ('-inf' without alternatives)
+        fragile_idx = self.fragile_ids[vertex_idx][move_idx]
+        belief_t = self.belief_codec.replace_edge_state(
+            belief_idx=belief_slice.belief_idx,
+            edge_idx=fragile_idx,
+            edge_state="T"
+        )
+        belief_f = self.belief_codec.replace_edge_state(
+            belief_idx=belief_slice.belief_idx,
+            edge_idx=fragile_idx,
+            edge_state="F"
+        )
+
+        alternative_values = [
+            lookup(self.successors[vertex_idx][alternative_move_idx], belief_t)
+            for alternative_move_idx in self.alternative_moves[move_idx]
+            if belief_slice.unblocked_open[vertex_idx][alternative_move_idx]
+        ]
+        if len(alternative_values) == 0:
+            return -math.inf
+
+        p = self.fragile_probabilities[fragile_idx]
+        q = 1 - p
+        exit_value = (
+            -self.costs[vertex_idx][move_idx] +
+            (p * max(alternative_values) + q * lookup(self.successors[vertex_idx][move_idx], belief_f))
+        )
+        return -math.inf if math.isnan(exit_value) else exit_value
+
+    def _belief_slice(self, belief_idx: int):
+        belief_slice = self.slices.get(belief_idx, None)
+        if belief_slice is not None:
+            return belief_slice
+
+        belief_slice = BeliefSlice(
+            belief_idx=belief_idx,
+            unblocked_open=self._unblocked_open(belief_idx=belief_idx),
+            vertices_count=self.transition_model.vertices_count
+        )
+        belief_slice.push(value=0.0, kind=self.exact_kind, vertex_idx=self.goal_idx, move_idx=-1)
+
+        # Exits over the unknown edges, from both of their ends, pushed with their optimistic bound
+        for edge_idx in range(self.belief_codec.edges_count):
+            if self.belief_codec.edge_state(belief_idx=belief_idx, edge_idx=edge_idx) != "U":
+                continue
+
+            for edge_end in range(2):
+                vertex_idx = int(self.transition_model.fragile_endpoints[edge_idx, edge_end])
+                move_idx = int(self.transition_model.fragile_moves[edge_idx, edge_end])
+                if vertex_idx < 0:
+                    continue
+
+                bound_value = self._exit_value(
+                    belief_slice=belief_slice,
+                    vertex_idx=vertex_idx,
+                    move_idx=move_idx,
+                    lookup=lambda successor_idx, _: self.bound_values[successor_idx]
+                )
+                if bound_value != -math.inf:
+                    belief_slice.push(
+                        value=bound_value,
+                        kind=self.exit_bound_kind,
+                        vertex_idx=vertex_idx,
+                        move_idx=move_idx
+                    )
+
+        self.slices[belief_idx] = belief_slice
+        return belief_slice
+
+    def _settle(self, belief_slice: BeliefSlice, vertex_idx: int, value: float):
+        values, settled = belief_slice.values, belief_slice.settled
+        successors, costs = self.successors[vertex_idx], self.costs[vertex_idx]
+        unblocked_open = belief_slice.unblocked_open[vertex_idx]
+        values[vertex_idx] = value
+        settled[vertex_idx] = True
+        self.settled_count += 1
+
+        if vertex_idx == self.goal_idx:
+            belief_slice.actions[vertex_idx] = self.goal_action_code
+        else:
+            # Same tie breaking as the backups: the first optimal move (in moves order) whose successor
+            # held its final value by the sweep this vertex settles in
+            move_sweeps = [None] * self.moves_count
+            for move_idx in range(self.moves_count):
+                successor_idx = successors[move_idx]
+                if unblocked_open[move_idx]:
+                    if settled[successor_idx] and -costs[move_idx] + values[successor_idx] == value:
+                        move_sweeps[move_idx] = (
+                            belief_slice.settle_sweeps[successor_idx] + int(successor_idx > vertex_idx)
+                        )
+                elif belief_slice.exit_values.get((vertex_idx, move_idx), None) == value:
+                    move_sweeps[move_idx] = 0
+
+            settle_sweep = max(1, min(move_sweep for move_sweep in move_sweeps if move_sweep is not None))
+            belief_slice.settle_sweeps[vertex_idx] = settle_sweep
+            belief_slice.actions[vertex_idx] = next(
+                move_idx
+                for move_idx, move_sweep in enumerate(move_sweeps)
+                if move_sweep is not None and move_sweep <= settle_sweep
+            )
+
+        # Relax the moves into this vertex
+        predecessor_moves = self.predecessor_moves[vertex_idx]
+        for move_idx, predecessor_idx in enumerate(successors):
+            if not unblocked_open[move_idx] or settled[predecessor_idx]:
+                continue
+
+            predecessor_move_idx = predecessor_moves[move_idx]
+            self.relaxations_count += 1
+            belief_slice.push(
+                value=-self.costs[predecessor_idx][predecessor_move_idx] + value,
+                kind=self.exact_kind,
+                vertex_idx=predecessor_idx,
+                move_idx=predecessor_move_idx
+            )
+
+    def _exit_lookup(self, successor_idx: int, belief_idx: int):
+        # Exact value of an exit successor, solved on demand
+        return self.value_and_action(vertex_idx=successor_idx, belief_idx=belief_idx)[0]
+
+    def _expand(self, belief_slice: BeliefSlice):
+        negative_value, kind, _, vertex_idx, move_idx = heapq.heappop(belief_slice.frontier)
+        if belief_slice.settled[vertex_idx]:
+            return
+
+        if kind == self.exit_bound_kind:
+            exit_value = self._exit_value(
+                belief_slice=belief_slice,
+                vertex_idx=vertex_idx,
+                move_idx=move_idx,
+                lookup=self._exit_lookup
+            )
+            self.evaluated_exits_count += 1
+            belief_slice.exit_values[(vertex_idx, move_idx)] = exit_value
+            if exit_value != -math.inf:
+                belief_slice.push(value=exit_value, kind=self.exact_kind, vertex_idx=vertex_idx, move_idx=move_idx)
+        else:
+            self._settle(belief_slice=belief_slice, vertex_idx=vertex_idx, value=-negative_value)
+
+    def value_and_action(self, vertex_idx: int, belief_idx: int):
+        # Value and action code of a single pair, resuming the search of its belief state as needed
+        belief_slice = self._belief_slice(belief_idx=belief_idx)
+        while not belief_slice.settled[vertex_idx] and len(belief_slice.frontier) > 0:
+            self._expand(belief_slice=belief_slice)
+        return belief_slice.values[vertex_idx], belief_slice.actions[vertex_idx]
@@ -1,25 +1,56 @@
 from state import State
 from ascii_parser import Parser
 from utility_of_states import UtilityOfStates
+from solution_store import SolutionStore
 from interface import Interface
 
 
-def run(data_filepath: str):
+def run(data_filepath: str,
+        solver_mode: str = "sequential",
+        solutions_directory: str = None,
+        table_directory: str = None,
+        show_progress: bool = True,
+        stats_filepath: str = None,
+        stats_hook=None,
+        solver_options: dict = None):
+    # 'solver_options': keyword arguments of the solver mode (e.g. 'time_budget' of the rtdp mode),
+    # 'stats_filepath': the solver stats are written there as JSON on exit,
+    # 'stats_hook': called as 'stats_hook(event_name, event_data)' on every solver stats event
     # Init Environment Data
     parser = Parser()
     environment_data = parser.parse_data(data_filepath=data_filepath)
+    environment_key = SolutionStore.environment_key(environment_data=environment_data)
 
     # Init State
     initial_state = State(environment_data=environment_data)
     initial_state.update_agent_packages_status()
 
-    # Init Utility of States
-    utility_of_states = UtilityOfStates(initial_state=initial_state)
-    utility_of_states.preform_value_iteration()
+    # Init Utility of States (a stored solution of the same environment is mapped instead of solving again)
+    utility_of_states = UtilityOfStates(initial_state=initial_state, show_progress=show_progress)
+    if stats_hook is not None:
+        utility_of_states.solver_stats.subscribe(stats_hook)
+    solution_store = None if solutions_directory is None else SolutionStore(directory=solutions_directory)
+    solution_loaded = solution_store is not None and utility_of_states.load_solution(
+        solution_store=solution_store,
+        environment_key=environment_key
+    )
+    if not solution_loaded:
+        utility_of_states.preform_value_iteration(
+            solver_mode=solver_mode,
+            table_directory=table_directory,
+            **(solver_options or dict())
+        )
+        if solution_store is not None and utility_of_states.utility_values is not None:
+            utility_of_states.save_solution(solution_store=solution_store, environment_key=environment_key)
 
     # Init Interface
     interface = Interface(initial_state=initial_state, utility_of_states=utility_of_states)
-    interface.run()
+    try:
+        interface.run()
+    finally:
+        if stats_filepath is not None:
+            with open(stats_filepath, "w") as stats_file:
+                utility_of_states.solver_stats.write_json(output_file=stats_file)
 
 
 def main():
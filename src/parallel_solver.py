@@ -0,0 +1,134 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from belief_codec import BeliefCodec
+from backup_engine import BackupEngine
+from action_table import ActionTable
+from transition_model import TransitionModel
+from disk_table import DiskTable
+from solver_stats import SolverStats
+
+
+# Per worker process backup engine over the shared utility table (set by '_init_worker')
+_worker_engine = None
+_worker_tables = list()
+
+
+def _attach_table(table_source: tuple, shape: tuple, dtype, order: str):
+    # Table source: ("shared_memory", memory name) or ("file", disk table path)
+    source_kind, source_name = table_source
+    if source_kind == "file":
+        disk_table = DiskTable(path=source_name, shape=shape, dtype=dtype, order=order)
+        _worker_tables.append(disk_table)
+        return disk_table.array
+
+    memory = shared_memory.SharedMemory(name=source_name)
+    _worker_tables.append(memory)
+    return np.ndarray(shape=shape, dtype=dtype, buffer=memory.buf, order=order)
+
+
+def _release_worker_tables():
+    for worker_table in _worker_tables:
+        if isinstance(worker_table, DiskTable):
+            worker_table.release()
+
+
+def _init_worker(transition_model: TransitionModel,
+                 goal_idx: int,
+                 edges_count: int,
+                 edge_endpoints: list,
+                 table_shape: tuple,
+                 codes_count: int,
+                 values_source: tuple,
+                 actions_source: tuple):
+    global _worker_engine
+
+    belief_codec = BeliefCodec(edges_count=edges_count)
+    utility_actions = ActionTable(
+        vertices_count=table_shape[0],
+        belief_codec=belief_codec,
+        edge_endpoints=edge_endpoints,
+        codes=_attach_table(table_source=actions_source, shape=(codes_count,), dtype=np.int8, order="C")
+    )
+    _worker_engine = BackupEngine(
+        transition_model=transition_model,
+        goal_idx=goal_idx,
+        belief_codec=belief_codec,
+        utility_values=_attach_table(table_source=values_source, shape=table_shape, dtype=np.float64, order="F"),
+        utility_actions=utility_actions
+    )
+
+
+def _solve_unknown_beliefs(belief_indices: list):
+    # Returns the sweeps count of each belief state, and the backups and improvements of the chunk
+    backups_count = _worker_engine.backups_count
+    improvements_count = _worker_engine.improvements_count
+    sweeps_counts = [_worker_engine.solve_belief(belief_idx=belief_idx) for belief_idx in belief_indices]
+    _release_worker_tables()
+    return (
+        sweeps_counts,
+        _worker_engine.backups_count - backups_count,
+        _worker_engine.improvements_count - improvements_count
+    )
+
+
+class ParallelSolver:
+    def __init__(self,
+                 transition_model: TransitionModel,
+                 goal_idx: int,
+                 belief_codec: BeliefCodec,
+                 utility_values: np.ndarray,
+                 utility_actions: ActionTable,
+                 table_sources: tuple,
+                 workers_count: int = None,
+                 chunks_per_worker: int = 4):
+        # Solves the unknown belief layers on a process pool, all workers read and write the tables in place.
+        # 'table_sources': where the workers attach to the values and the actions tables, each one
+        # ("shared_memory", memory name) or ("file", disk table path)
+        self.transition_model = transition_model
+        self.goal_idx = goal_idx
+        self.belief_codec = belief_codec
+        self.utility_values = utility_values
+        self.utility_actions = utility_actions
+        self.table_sources = table_sources
+        self.workers_count = os.cpu_count() if workers_count is None else workers_count
+        self.chunks_per_worker = chunks_per_worker
+
+        if self.workers_count < 1:
+            raise ValueError(f"Workers count must be positive, got '{self.workers_count}'")
+
+    def _chunks(self, belief_indices: np.ndarray):
+        chunks_count = min(len(belief_indices), self.workers_count * self.chunks_per_worker)
+        return [chunk.tolist() for chunk in np.array_split(np.asarray(belief_indices, dtype=np.int64), chunks_count)]
+
+    def solve(self, unknown_layers, beliefs_count: int, solver_stats: SolverStats = None):
+        # Belief states within a layer depend only on earlier layers, so each layer is one parallel
+        # dispatch and waiting for all of its chunks is the barrier before the next layer.
+        # The work the workers report is counted here
+        solver_stats = SolverStats() if solver_stats is None else solver_stats
+        values_source, actions_source = self.table_sources
+        with ProcessPoolExecutor(
+            max_workers=self.workers_count,
+            initializer=_init_worker,
+            initargs=(
+                self.transition_model,
+                self.goal_idx,
+                self.belief_codec.edges_count,
+                self.utility_actions.edge_endpoints,
+                self.utility_values.shape,
+                self.utility_actions.codes_count,
+                values_source,
+                actions_source
+            )
+        ) as executor, solver_stats.phase(phase_name="unknown_layers", total=beliefs_count):
+            for unknown_layer in unknown_layers:
+                chunks = self._chunks(belief_indices=unknown_layer)
+                for chunk, chunk_work in zip(chunks, executor.map(_solve_unknown_beliefs, chunks)):
+                    sweeps_counts, backups_count, improvements_count = chunk_work
+                    for belief_idx, sweeps_count in zip(chunk, sweeps_counts):
+                        solver_stats.belief_solved(belief_idx=belief_idx, sweeps_count=sweeps_count)
+                    solver_stats.count(counter_name="backups", amount=backups_count)
+                    solver_stats.count(counter_name="improvements", amount=improvements_count)
+                    solver_stats.advance(phase_name="unknown_layers", amount=len(chunk))
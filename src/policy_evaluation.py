@@ -0,0 +1,123 @@
+import numpy as np
+
+from utility_of_states import UtilityOfStates
+
+
+class PolicyEvaluator:
+    def __init__(self, utility_of_states: UtilityOfStates, seed: int = None, batch_size: int = 65536):
+        # Monte Carlo evaluation of the solved policy: every episode samples which fragile edges are blocked
+        # and all the episodes of a batch walk the policy together, one step per iteration
+        self.utility_of_states = utility_of_states
+        self.transition_model = utility_of_states.transition_model
+        self.belief_codec = utility_of_states.belief_codec
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+
+        if self.transition_model is None:
+            raise ValueError("The policy must be solved before it is evaluated")
+
+        self.start_idx = utility_of_states.state.coordinates_to_vertex_index(
+            coords=utility_of_states.all_packages[0]["package_at"]
+        )
+        self.goal_idx = utility_of_states.goal_idx
+        self.fragile_probabilities = self.transition_model.fragile_probabilities
+        self.edge_weights = np.array(self.belief_codec.edge_weights, dtype=np.int64)
+        self.edge_states_count = len(self.belief_codec.edge_states)
+
+        # Fragile edges revealed at each vertex (standing on one of their ends)
+        self.incident_edges = np.zeros(
+            shape=(self.transition_model.vertices_count, self.belief_codec.edges_count),
+            dtype=bool
+        )
+        for vertex_idx, edge_indices in utility_of_states.incident_unknown_edges.items():
+            self.incident_edges[vertex_idx, edge_indices] = True
+
+        # Every step the policy takes moves closer to the goal or reveals an edge
+        self.max_steps = self.transition_model.vertices_count * (self.belief_codec.edges_count + 1)
+
+    def sample_blocked_edges(self, episodes_count: int):
+        # Blocked fragile edges of each episode
+        return self.rng.random(size=(episodes_count, self.belief_codec.edges_count)) < self.fragile_probabilities
+
+    def _reveal_incident_edges(self,
+                               vertex_indices: np.ndarray,
+                               belief_indices: np.ndarray,
+                               blocked_edges: np.ndarray):
+        edge_digits = (belief_indices[:, None] // self.edge_weights) % self.edge_states_count
+        revealed_edges = self.incident_edges[vertex_indices] & (edge_digits == self.belief_codec.edge_state_digits["U"])
+        revealed_digits = np.where(
+            blocked_edges,
+            self.belief_codec.edge_state_digits["T"],
+            self.belief_codec.edge_state_digits["F"]
+        )
+        digits_change = np.where(revealed_edges, revealed_digits - edge_digits, 0)
+        return belief_indices + digits_change @ self.edge_weights
+
+    def walk(self, blocked_edges: np.ndarray):
+        # Path cost of each episode ('inf' if the policy stops before reaching the goal)
+        episodes_count = blocked_edges.shape[0]
+        vertex_indices = np.full(shape=episodes_count, fill_value=self.start_idx, dtype=np.int64)
+        belief_indices = np.full(
+            shape=episodes_count,
+            fill_value=self.belief_codec.encode(unknown_state=self.utility_of_states.get_initial_unknown_state()),
+            dtype=np.int64
+        )
+        path_costs = np.zeros(shape=episodes_count, dtype=np.float64)
+        active = np.arange(episodes_count)
+
+        for _ in range(self.max_steps):
+            # Episodes at the goal are done
+            active = active[vertex_indices[active] != self.goal_idx]
+            if len(active) == 0:
+                break
+
+            belief_indices[active] = self._reveal_incident_edges(
+                vertex_indices=vertex_indices[active],
+                belief_indices=belief_indices[active],
+                blocked_edges=blocked_edges[active]
+            )
+            action_codes = self.utility_of_states.policy_action_codes(
+                vertex_indices=vertex_indices[active],
+                belief_indices=belief_indices[active]
+            )
+
+            # No action: the policy stops, the goal might be unreachable
+            stopped = action_codes < 0
+            path_costs[active[stopped]] = np.inf
+            active, action_codes = active[~stopped], action_codes[~stopped]
+
+            path_costs[active] += self.transition_model.costs[vertex_indices[active], action_codes]
+            vertex_indices[active] = self.transition_model.successors[vertex_indices[active], action_codes]
+
+        path_costs[active[vertex_indices[active] != self.goal_idx]] = np.inf
+        return path_costs
+
+    def evaluate(self, episodes_count: int):
+        path_costs = np.concatenate([
+            self.walk(blocked_edges=self.sample_blocked_edges(
+                episodes_count=min(self.batch_size, episodes_count - batch_start)
+            ))
+            for batch_start in range(0, episodes_count, self.batch_size)
+        ])
+        reached = np.isfinite(path_costs)
+        return {
+            "episodes_count": episodes_count,
+            "reached_count": int(reached.sum()),
+            "mean_cost": float(path_costs[reached].mean()) if reached.any() else np.inf,
+            "cost_variance": float(path_costs[reached].var()) if reached.any() else np.nan,
+            "mean_utility": float(-path_costs.mean()) if episodes_count > 0 else np.nan
+        }
+
+    def evaluation_report(self, episodes_count: int):
+        evaluation = self.evaluate(episodes_count=episodes_count)
+        start_value, _ = self.utility_of_states.utility_value_and_action(
+            vertex_idx=self.start_idx,
+            unknown_state=self.utility_of_states.get_initial_unknown_state()
+        )
+        return (
+            f"Policy Evaluation ({evaluation['episodes_count']} sampled graph instances):\n"
+            f"Goal reached: {evaluation['reached_count']}/{evaluation['episodes_count']}\n"
+            f"Path cost mean: {evaluation['mean_cost']}, variance: {evaluation['cost_variance']}\n"
+            f"Empirical Utility: {evaluation['mean_utility']}\n"
+            f"Policy Expected Utility: {start_value}\n"
+        )
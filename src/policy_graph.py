@@ -0,0 +1,180 @@
+import json
+import itertools
+import numpy as np
+
+
+class PolicyNode:
+    def __init__(self, node_id: int, vertex_idx: int, belief_idx: int):
+        self.node_id = node_id
+        self.vertex_idx = vertex_idx
+        self.belief_idx = belief_idx
+
+        # Observation node: standing here reveals unknown edges, one branch (edge states, node id) per outcome
+        self.revealed_edge_indices = list()
+        self.branches = list()
+
+        # Decision node: expected utility, action (None when the policy stops) and the node it leads to
+        self.value = None
+        self.action = None
+        self.next_node_id = None
+
+    def is_observation(self):
+        return len(self.revealed_edge_indices) > 0
+
+
+class PolicyGraph:
+    def __init__(self, utility_of_states):
+        # The policy from the package location as a DAG: a node per distinct (vertex, belief state) pair, so
+        # observation histories that lead to the same pair share its subgraph
+        self.utility_of_states = utility_of_states
+        self.state = utility_of_states.state
+        self.belief_codec = utility_of_states.belief_codec
+        self.transition_model = utility_of_states.transition_model
+        self.goal_idx = utility_of_states.goal_idx
+        self.policy_bulk = utility_of_states.policy_bulk
+
+        if self.transition_model is None:
+            raise ValueError("The policy must be solved before its graph is built")
+
+        self.nodes = list()
+        self.node_ids = dict()
+        self.pending_node_ids = list()
+
+        start_location = utility_of_states.all_packages[0]["package_at"]
+        self.start_idx = self.state.coordinates_to_vertex_index(coords=start_location)
+        self.initial_unknown_state = utility_of_states.get_initial_unknown_state()
+        self.start_node_id = self._node_id(
+            vertex_idx=self.start_idx,
+            belief_idx=self.belief_codec.encode(unknown_state=self.initial_unknown_state)
+        )
+        while len(self.pending_node_ids) > 0:
+            self._expand(policy_node=self.nodes[self.pending_node_ids.pop()])
+
+    def _node_id(self, vertex_idx: int, belief_idx: int):
+        # Memoized: every pair is expanded once
+        node_key = (vertex_idx, belief_idx)
+        node_id = self.node_ids.get(node_key, None)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.nodes.append(PolicyNode(node_id=node_id, vertex_idx=vertex_idx, belief_idx=belief_idx))
+            self.node_ids[node_key] = node_id
+            self.pending_node_ids.append(node_id)
+        return node_id
+
+    def _expand(self, policy_node: PolicyNode):
+        vertex_idx, belief_idx = policy_node.vertex_idx, policy_node.belief_idx
+        if vertex_idx != self.goal_idx:
+            policy_node.revealed_edge_indices = [
+                edge_idx for edge_idx in self.utility_of_states.incident_unknown_edges.get(vertex_idx, list())
+                if self.belief_codec.edge_state(belief_idx=belief_idx, edge_idx=edge_idx) == "U"
+            ]
+
+        if policy_node.is_observation():
+            for edge_states in itertools.product(["F", "T"], repeat=len(policy_node.revealed_edge_indices)):
+                revealed_belief_idx = belief_idx
+                for edge_idx, edge_state in zip(policy_node.revealed_edge_indices, edge_states):
+                    revealed_belief_idx = self.belief_codec.replace_edge_state(
+                        belief_idx=revealed_belief_idx,
+                        edge_idx=edge_idx,
+                        edge_state=edge_state
+                    )
+                policy_node.branches.append(
+                    (list(edge_states), self._node_id(vertex_idx=vertex_idx, belief_idx=revealed_belief_idx))
+                )
+            return
+
+        policy_node.value, policy_node.action = self.utility_of_states.utility_value_and_action(
+            vertex_idx=vertex_idx,
+            unknown_state=self.belief_codec.decode(belief_idx=belief_idx)
+        )
+        if vertex_idx == self.goal_idx:
+            policy_node.action = "no-op"
+        elif policy_node.action is not None:
+            next_vertex_idx = self.transition_model.successors[
+                vertex_idx,
+                self.utility_of_states.action_names.index(policy_node.action)
+            ]
+            policy_node.next_node_id = self._node_id(vertex_idx=int(next_vertex_idx), belief_idx=belief_idx)
+
+    def _location_str(self, vertex_idx: int):
+        location = self.state.vertex_index_to_coordinates(idx=vertex_idx)
+        return f"({location[0]},{location[1]})"
+
+    def _blocked_str(self, policy_node: PolicyNode, edge_states: list):
+        return " and ".join(
+            f"Blocked['{self.utility_of_states.unknown_edges[edge_idx]['identifier']}']={edge_state}"
+            for edge_idx, edge_state in zip(policy_node.revealed_edge_indices, edge_states)
+        )
+
+    def expected_utility(self):
+        expected_value, _ = self.utility_of_states.utility_value_and_action(
+            vertex_idx=self.start_idx,
+            unknown_state=self.initial_unknown_state
+        )
+        return expected_value
+
+    def text_lines(self):
+        # One line per node and per node choice, the nodes in the order they were discovered
+        yield "The Constructed Policy:\n\n"
+
+        for policy_node in self.nodes:
+            location_str = self._location_str(vertex_idx=policy_node.vertex_idx)
+            unknown_state = self.belief_codec.decode(belief_idx=policy_node.belief_idx)
+            if policy_node.is_observation():
+                yield f"Node {policy_node.node_id}: At '{location_str}', Belief: {unknown_state}\n"
+                for edge_states, next_node_id in policy_node.branches:
+                    blocked_str = self._blocked_str(policy_node=policy_node, edge_states=edge_states)
+                    yield f"{self.policy_bulk} If ({blocked_str}): Node {next_node_id}\n"
+                continue
+
+            yield (
+                f"Node {policy_node.node_id}: At '{location_str}', Belief: {unknown_state}, "
+                f"Expected Utility: {policy_node.value}\n"
+            )
+            if policy_node.vertex_idx == self.goal_idx:
+                yield f"{self.policy_bulk} Action: 'no-op' (Goal reached)\n"
+            elif policy_node.action is None:
+                yield f"{self.policy_bulk} Action: 'no-op' (Goal might be unreachable and it's best to stop)\n"
+            else:
+                next_location_str = self._location_str(vertex_idx=self.nodes[policy_node.next_node_id].vertex_idx)
+                yield (
+                    f"{self.policy_bulk} Action: '{policy_node.action}' "
+                    f"(From '{location_str}' to '{next_location_str}'): Node {policy_node.next_node_id}\n"
+                )
+
+        yield f"\nPolicy Expected Utility: {self.expected_utility()}\n"
+
+    def _node_json(self, policy_node: PolicyNode):
+        node_json = {
+            "id": policy_node.node_id,
+            "location": self.state.vertex_index_to_coordinates(idx=policy_node.vertex_idx),
+            "belief": self.belief_codec.decode(belief_idx=policy_node.belief_idx)
+        }
+        if policy_node.is_observation():
+            node_json["branches"] = [
+                {
+                    "blocked": {
+                        self.utility_of_states.unknown_edges[edge_idx]["identifier"]: edge_state
+                        for edge_idx, edge_state in zip(policy_node.revealed_edge_indices, edge_states)
+                    },
+                    "next": next_node_id
+                }
+                for edge_states, next_node_id in policy_node.branches
+            ]
+        else:
+            # Non finite utilities (unreachable goal) are written as null
+            node_json["value"] = float(policy_node.value) if np.isfinite(policy_node.value) else None
+            node_json["action"] = policy_node.action
+            node_json["next"] = policy_node.next_node_id
+            node_json["goal_reached"] = policy_node.vertex_idx == self.goal_idx
+        return node_json
+
+    def json_lines(self):
+        # A single JSON document, one node per line
+        expected_value = self.expected_utility()
+        expected_value = float(expected_value) if np.isfinite(expected_value) else None
+        yield f'{{"start_node": {self.start_node_id}, "expected_utility": {json.dumps(expected_value)}, "nodes": [\n'
+        for policy_node in self.nodes:
+            separator = ",\n" if policy_node.node_id < len(self.nodes) - 1 else "\n"
+            yield f"  {json.dumps(self._node_json(policy_node=policy_node))}{separator}"
+        yield "]}\n"
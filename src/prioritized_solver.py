@@ -0,0 +1,48 @@
+import numpy as np
+
+from belief_codec import BeliefCodec
+from lazy_solver import LazySolver
+from action_table import ActionTable
+from transition_model import TransitionModel
+
+
+class PrioritizedSolver(LazySolver):
+    def __init__(self,
+                 transition_model: TransitionModel,
+                 goal_idx: int,
+                 belief_codec: BeliefCodec,
+                 goal_action_code: int,
+                 utility_values: np.ndarray,
+                 utility_actions: ActionTable):
+        # Prioritized sweeping into the utility table: a belief state is one backward search from the goal in
+        # value order, and a vertex is backed up only when one of its successors settles. Exits over unknown
+        # edges read the belief states with that edge revealed, which earlier layers already solved
+        super().__init__(
+            transition_model=transition_model,
+            goal_idx=goal_idx,
+            belief_codec=belief_codec,
+            goal_action_code=goal_action_code
+        )
+        self.utility_values = utility_values
+        self.utility_actions = utility_actions
+        self.non_goal_indices = np.array(
+            [vertex_idx for vertex_idx in range(transition_model.vertices_count) if vertex_idx != goal_idx],
+            dtype=np.int64
+        )
+
+    def _exit_lookup(self, successor_idx: int, belief_idx: int):
+        return float(self.utility_values[successor_idx, belief_idx])
+
+    def solve_belief(self, belief_idx: int):
+        # The whole search runs to the end, vertices it never settles keep '-inf' and no action
+        belief_slice = self._belief_slice(belief_idx=belief_idx)
+        while len(belief_slice.frontier) > 0:
+            self._expand(belief_slice=belief_slice)
+        del self.slices[belief_idx]
+
+        self.utility_values[:, belief_idx] = belief_slice.values
+        self.utility_actions.store(
+            vertex_indices=self.non_goal_indices,
+            belief_indices=belief_idx,
+            action_codes=np.array(belief_slice.actions, dtype=np.int8)[self.non_goal_indices]
+        )
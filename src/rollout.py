@@ -0,0 +1,84 @@
+import numpy as np
+
+from utility_of_states import UtilityOfStates
+
+
+class RolloutKernel:
+    def __init__(self, utility_of_states: UtilityOfStates):
+        # Walks the solved policy on one realized graph instance with integer vertex and belief indices only:
+        # the tables are read through plain lists and memory views, and the action trace is written into a
+        # buffer allocated once
+        self.utility_of_states = utility_of_states
+        self.transition_model = utility_of_states.transition_model
+        self.belief_codec = utility_of_states.belief_codec
+
+        if self.transition_model is None:
+            raise ValueError("The policy must be solved before it is rolled out")
+
+        self.goal_idx = utility_of_states.goal_idx
+        self.successors = self.transition_model.successors.tolist()
+        self.costs = self.transition_model.costs.tolist()
+        self.edge_weights = list(self.belief_codec.edge_weights)
+        self.unknown_digit = self.belief_codec.edge_state_digits["U"]
+        self.revealed_digits = (self.belief_codec.edge_state_digits["F"], self.belief_codec.edge_state_digits["T"])
+        self.incident_edges = [
+            utility_of_states.incident_unknown_edges.get(vertex_idx, list())
+            for vertex_idx in range(self.transition_model.vertices_count)
+        ]
+
+        # The active solver answers on demand (the lazy solver or the rtdp policy), even if an older table exists,
+        # otherwise the action table view is read
+        if utility_of_states.rtdp_solver is not None:
+            self.lookup_solver = utility_of_states.rtdp_solver
+        else:
+            self.lookup_solver = utility_of_states.lazy_solver
+        utility_actions = None if self.lookup_solver is not None else utility_of_states.utility_actions
+        self.vertices_count = self.transition_model.vertices_count
+        self.codes = None if utility_actions is None else memoryview(utility_actions.codes)
+
+        # Every step the policy takes moves closer to the goal or reveals an edge
+        self.max_steps = self.transition_model.vertices_count * (self.belief_codec.edges_count + 1)
+        self.trace = np.empty(shape=self.max_steps + 1, dtype=np.int8)
+        self.trace_view = memoryview(self.trace)
+
+    def _action_code(self, vertex_idx: int, belief_idx: int):
+        if self.codes is None:
+            return self.lookup_solver.value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)[1]
+
+        return self.codes[belief_idx * self.vertices_count + vertex_idx]
+
+    def rollout(self, start_idx: int, goal_idx: int, blocked_edges_mask: int):
+        # Blocked edges mask: bit 'i' is set when unknown edge 'i' is blocked in the realized graph instance.
+        # Returns the action codes taken (a final '-1' when the policy stops) and the path cost ('inf' if the
+        # goal was not reached), the trace is a view of the kernel buffer valid until the next rollout
+        if goal_idx != self.goal_idx:
+            raise ValueError(f"The policy was solved for goal '{self.goal_idx}', got '{goal_idx}'")
+
+        vertex_idx = start_idx
+        belief_idx = self.belief_codec.beliefs_count - 1
+        unknown_edges_mask = (1 << self.belief_codec.edges_count) - 1
+        path_cost = 0.0
+        steps_count = 0
+
+        while vertex_idx != goal_idx and steps_count < self.max_steps:
+            # Standing on an end of an unknown edge reveals it
+            for edge_idx in self.incident_edges[vertex_idx]:
+                if unknown_edges_mask >> edge_idx & 1:
+                    revealed_digit = self.revealed_digits[blocked_edges_mask >> edge_idx & 1]
+                    belief_idx += (revealed_digit - self.unknown_digit) * self.edge_weights[edge_idx]
+                    unknown_edges_mask &= ~(1 << edge_idx)
+
+            action_code = self._action_code(vertex_idx=vertex_idx, belief_idx=belief_idx)
+            self.trace_view[steps_count] = action_code
+            steps_count += 1
+
+            # No action: the policy stops, the goal might be unreachable
+            if action_code < 0:
+                break
+
+            path_cost += self.costs[vertex_idx][action_code]
+            vertex_idx = self.successors[vertex_idx][action_code]
+
+        if vertex_idx != goal_idx:
+            path_cost = np.inf
+        return self.trace[:steps_count], path_cost
@@ -0,0 +1,320 @@
+import math
+import time
+import heapq
+import random
+
+from belief_codec import BeliefCodec
+from transition_model import TransitionModel
+
+
+class RtdpSolver:
+    def __init__(self,
+                 transition_model: TransitionModel,
+                 goal_idx: int,
+                 belief_codec: BeliefCodec,
+                 goal_action_code: int,
+                 start_idx: int,
+                 seed: int = None,
+                 epsilon: float = 1e-9):
+        # Anytime solver: trials of labeled real time dynamic programming from the initial belief state at the package
+        # location, with the same backups as the exact solver over the (vertex, belief state) pairs they reach.
+        # Pairs not backed up yet are valued by the known layer shortest path with the unknown edges unblocked
+        # (an upper bound of their value), so the greedy policy is defined at any point
+        self.goal_idx = goal_idx
+        self.belief_codec = belief_codec
+        self.goal_action_code = goal_action_code
+        self.start_idx = start_idx
+        self.rng = random.Random(seed)
+        self.epsilon = epsilon
+        self.moves_count = transition_model.moves_count
+        self.vertices_count = transition_model.vertices_count
+
+        self.successors = transition_model.successors.tolist()
+        self.costs = transition_model.costs.tolist()
+        self.fragile_ids = transition_model.fragile_ids.tolist()
+        self.fragile_probabilities = transition_model.fragile_probabilities.tolist()
+        self.alternative_moves = transition_model.alternative_moves.tolist()
+        self.edge_weights = list(belief_codec.edge_weights)
+        self.digits = belief_codec.edge_state_digits
+        self.incident_edges = [list() for _ in range(self.vertices_count)]
+        for edge_idx, edge_ends in enumerate(transition_model.fragile_endpoints.tolist()):
+            for vertex_idx in edge_ends:
+                if vertex_idx >= 0:
+                    self.incident_edges[vertex_idx].append(edge_idx)
+
+        # Backed up values, pairs whose greedy envelope converged, and the heuristic values per belief state
+        # (shared by those with the same unblocked edges once the unknown ones are unblocked)
+        self.values = dict()
+        self.solved_pairs = set()
+        self.heuristic_values = dict()
+        self.optimistic_values = dict()
+
+        # Every step moves closer to the goal or reveals an edge, so a value below the cost of the longest such
+        # path means the goal is not reached from the pair ('-inf', as in the exact solver)
+        self.max_trial_steps = self.vertices_count * (belief_codec.edges_count + 1)
+        max_cost = max([cost for vertex_costs in self.costs for cost in vertex_costs], default=0.0)
+        self.dead_end_value = -max_cost * self.max_trial_steps
+        self.backups_count = 0
+        self.trials_count = 0
+        self.residual = math.inf
+
+    def _edge_digit(self, belief_idx: int, edge_idx: int):
+        return (belief_idx // self.edge_weights[edge_idx]) % len(self.belief_codec.edge_states)
+
+    def _replace_digit(self, belief_idx: int, edge_idx: int, edge_state: str):
+        current_digit = self._edge_digit(belief_idx=belief_idx, edge_idx=edge_idx)
+        return belief_idx + (self.digits[edge_state] - current_digit) * self.edge_weights[edge_idx]
+
+    def _heuristic(self, belief_idx: int):
+        heuristic_values = self.heuristic_values.get(belief_idx, None)
+        if heuristic_values is not None:
+            return heuristic_values
+
+        optimistic_idx = belief_idx
+        for edge_idx in range(self.belief_codec.edges_count):
+            if self._edge_digit(optimistic_idx, edge_idx) == self.digits["U"]:
+                optimistic_idx = self._replace_digit(optimistic_idx, edge_idx, "F")
+
+        heuristic_values = self.optimistic_values.get(optimistic_idx, None)
+        if heuristic_values is None:
+            # Shortest path to the goal in the known belief state, blocked edges removed
+            heuristic_values = [-math.inf] * self.vertices_count
+            frontier = [(0.0, self.goal_idx)]
+            while len(frontier) > 0:
+                distance, vertex_idx = heapq.heappop(frontier)
+                if heuristic_values[vertex_idx] != -math.inf:
+                    continue
+
+                heuristic_values[vertex_idx] = -distance
+                for move_idx, predecessor_idx in enumerate(self.successors[vertex_idx]):
+                    if predecessor_idx < 0 or heuristic_values[predecessor_idx] != -math.inf:
+                        continue
+                    fragile_idx = self.fragile_ids[vertex_idx][move_idx]
+                    if fragile_idx >= 0 and self._edge_digit(optimistic_idx, fragile_idx) == self.digits["T"]:
+                        continue
+                    heapq.heappush(frontier, (distance + self.costs[vertex_idx][move_idx], predecessor_idx))
+            self.optimistic_values[optimistic_idx] = heuristic_values
+
+        self.heuristic_values[belief_idx] = heuristic_values
+        return heuristic_values
+
+    def _value(self, vertex_idx: int, belief_idx: int):
+        if vertex_idx == self.goal_idx:
+            return 0.0
+        value = self.values.get((vertex_idx, belief_idx), None)
+        return self._heuristic(belief_idx=belief_idx)[vertex_idx] if value is None else value
+
+    def _move_open(self, vertex_idx: int, move_idx: int, belief_idx: int):
+        # Whether the move is available and its edge state digit ('F' for normal edges)
+        if self.successors[vertex_idx][move_idx] < 0:
+            return None
+        fragile_idx = self.fragile_ids[vertex_idx][move_idx]
+        return self.digits["F"] if fragile_idx < 0 else self._edge_digit(belief_idx, fragile_idx)
+
+    def _best_move(self, vertex_idx: int, belief_idx: int):
+        # Same expectation as the backups of the exact solver. Returns the value, the first move (in moves order)
+        # reaching it ('-1' if none) and, for a move over an unknown edge, the alternative successor if blocked
+        best_value, best_move_idx, best_alternative_idx = -math.inf, -1, -1
+        for move_idx in range(self.moves_count):
+            edge_digit = self._move_open(vertex_idx=vertex_idx, move_idx=move_idx, belief_idx=belief_idx)
+            if edge_digit is None or edge_digit == self.digits["T"]:
+                continue
+
+            successor_idx = self.successors[vertex_idx][move_idx]
+            alternative_idx = -1
+            if edge_digit == self.digits["F"]:
+                move_value = -self.costs[vertex_idx][move_idx] + self._value(successor_idx, belief_idx)
+            else:
+                fragile_idx = self.fragile_ids[vertex_idx][move_idx]
+                belief_t = self._replace_digit(belief_idx, fragile_idx, "T")
+                belief_f = self._replace_digit(belief_idx, fragile_idx, "F")
+                alternative_value = -math.inf
+                for alternative_move_idx in self.alternative_moves[move_idx]:
+                    if self._move_open(vertex_idx, alternative_move_idx, belief_idx) != self.digits["F"]:
+                        continue
+                    alternative_successor_idx = self.successors[vertex_idx][alternative_move_idx]
+                    value = self._value(alternative_successor_idx, belief_t)
+                    if alternative_idx < 0 or value > alternative_value:
+                        alternative_value, alternative_idx = value, alternative_successor_idx
+                if alternative_idx < 0:
+                    continue
+
+                p = self.fragile_probabilities[fragile_idx]
+                q = 1 - p
+                move_value = (
+                    -self.costs[vertex_idx][move_idx] +
+                    (p * alternative_value + q * self._value(successor_idx, belief_f))
+                )
+                if math.isnan(move_value):
+                    continue
+
+            if move_value > best_value:
+                best_value, best_move_idx, best_alternative_idx = move_value, move_idx, alternative_idx
+        if best_value < self.dead_end_value:
+            return -math.inf, -1, -1
+        return best_value, best_move_idx, best_alternative_idx
+
+    def _backup(self, vertex_idx: int, belief_idx: int):
+        # Returns the greedy move of the pair and its alternative successor
+        value, move_idx, alternative_idx = self._best_move(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        self.values[(vertex_idx, belief_idx)] = value
+        self.backups_count += 1
+        return move_idx, alternative_idx
+
+    def _outcomes(self, vertex_idx: int, belief_idx: int, move_idx: int, alternative_idx: int):
+        # (probability, vertex, belief state) after the move: an unknown edge is crossed if unblocked, the
+        # alternative successor is reached otherwise
+        successor_idx = self.successors[vertex_idx][move_idx]
+        if alternative_idx < 0:
+            return [(1.0, successor_idx, belief_idx)]
+
+        fragile_idx = self.fragile_ids[vertex_idx][move_idx]
+        p = self.fragile_probabilities[fragile_idx]
+        return [
+            (probability, outcome_idx, outcome_belief_idx)
+            for probability, outcome_idx, outcome_belief_idx in [
+                (p, alternative_idx, self._replace_digit(belief_idx, fragile_idx, "T")),
+                (1 - p, successor_idx, self._replace_digit(belief_idx, fragile_idx, "F"))
+            ]
+            if probability > 0
+        ]
+
+    def _reveals(self, vertex_idx: int, belief_idx: int):
+        # (probability, belief state) after standing on the vertex reveals its unknown incident edges
+        reveals = [(1.0, belief_idx)]
+        for edge_idx in self.incident_edges[vertex_idx]:
+            if self._edge_digit(belief_idx, edge_idx) != self.digits["U"]:
+                continue
+            p = self.fragile_probabilities[edge_idx]
+            reveals = [
+                (probability * edge_probability, self._replace_digit(revealed_idx, edge_idx, edge_state))
+                for probability, revealed_idx in reveals
+                for edge_probability, edge_state in [(p, "T"), (1 - p, "F")]
+                if edge_probability > 0
+            ]
+        return reveals
+
+    def _sample(self, outcomes: list):
+        threshold = self.rng.random()
+        for outcome in outcomes:
+            threshold -= outcome[0]
+            if threshold < 0:
+                return outcome
+        return outcomes[-1]
+
+    def _greedy_pairs(self, vertex_idx: int, belief_idx: int, move_idx: int, alternative_idx: int):
+        # Pairs the greedy policy reaches in one step: by its move, or by revealing the incident edges
+        next_pairs = [
+            (outcome_idx, outcome_belief_idx)
+            for _, outcome_idx, outcome_belief_idx in (
+                list() if move_idx < 0 else self._outcomes(vertex_idx, belief_idx, move_idx, alternative_idx)
+            )
+        ]
+        next_pairs += [(vertex_idx, revealed_idx) for _, revealed_idx in self._reveals(vertex_idx, belief_idx)]
+        return next_pairs
+
+    def _trial(self, deadline: float = None):
+        # Follows the greedy moves from the initial belief state until the goal or a solved pair, backing up every
+        # pair on the way. On a vertex with unknown incident edges the trial either keeps the belief state (as the
+        # backups do) or reveals them (as the policy does). The way back checks which pairs are solved
+        visited = list()
+        vertex_idx, belief_idx = self.start_idx, self.belief_codec.beliefs_count - 1
+        for _ in range(self.max_trial_steps):
+            if vertex_idx == self.goal_idx or (vertex_idx, belief_idx) in self.solved_pairs:
+                break
+            if len(self.incident_edges[vertex_idx]) > 0 and self.rng.random() < 0.5:
+                _, belief_idx = self._sample(outcomes=self._reveals(vertex_idx=vertex_idx, belief_idx=belief_idx))
+                if (vertex_idx, belief_idx) in self.solved_pairs:
+                    break
+
+            move_idx, alternative_idx = self._backup(vertex_idx=vertex_idx, belief_idx=belief_idx)
+            visited.append((vertex_idx, belief_idx))
+            if move_idx < 0:
+                break
+            _, vertex_idx, belief_idx = self._sample(outcomes=self._outcomes(
+                vertex_idx=vertex_idx,
+                belief_idx=belief_idx,
+                move_idx=move_idx,
+                alternative_idx=alternative_idx
+            ))
+
+        for vertex_idx, belief_idx in reversed(visited):
+            if not self._check_solved(vertex_idx=vertex_idx, belief_idx=belief_idx, deadline=deadline):
+                break
+        self.trials_count += 1
+
+    def _check_solved(self, vertex_idx: int, belief_idx: int, deadline: float = None):
+        # Labels the greedy envelope of the pair as solved if every residual in it is within epsilon, the pairs
+        # above it are not expanded and the envelope is backed up in reverse order otherwise. The residual
+        # estimate is the largest one seen
+        pending = [(vertex_idx, belief_idx)]
+        reached = set(pending)
+        envelope = list()
+        solved = True
+        max_residual = 0.0
+        while len(pending) > 0:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+
+            vertex_idx, belief_idx = pending.pop()
+            if vertex_idx == self.goal_idx or (vertex_idx, belief_idx) in self.solved_pairs:
+                continue
+            envelope.append((vertex_idx, belief_idx))
+            value, move_idx, alternative_idx = self._best_move(vertex_idx=vertex_idx, belief_idx=belief_idx)
+            previous_value = self._value(vertex_idx=vertex_idx, belief_idx=belief_idx)
+            residual = 0.0 if value == previous_value else abs(value - previous_value)
+            max_residual = max(max_residual, residual)
+            if residual > self.epsilon:
+                solved = False
+                continue
+
+            for next_pair in self._greedy_pairs(vertex_idx, belief_idx, move_idx, alternative_idx):
+                if next_pair not in reached:
+                    reached.add(next_pair)
+                    pending.append(next_pair)
+
+        self.residual = max_residual
+        if solved:
+            self.solved_pairs.update(envelope)
+        else:
+            for vertex_idx, belief_idx in reversed(envelope):
+                self._backup(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        return solved
+
+    def solve(self, time_budget: float = None, backups_budget: int = None):
+        # Runs trials until the initial belief state is solved (every residual of the greedy policy is within
+        # epsilon) or a budget is spent, can be called again to keep improving the policy
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        max_backups = None if backups_budget is None else self.backups_count + backups_budget
+        while not self.converged():
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if max_backups is not None and self.backups_count >= max_backups:
+                break
+            self._trial(deadline=deadline)
+
+    def converged(self):
+        return self.start_idx == self.goal_idx or (
+            (self.start_idx, self.belief_codec.beliefs_count - 1) in self.solved_pairs
+        )
+
+    def value_and_action(self, vertex_idx: int, belief_idx: int):
+        # Current greedy value and action code of a pair ('-1' if there is no move)
+        if vertex_idx == self.goal_idx:
+            return 0.0, self.goal_action_code
+        value, move_idx, _ = self._best_move(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        return value, move_idx
+
+    def convergence(self):
+        start_value, _ = self.value_and_action(
+            vertex_idx=self.start_idx,
+            belief_idx=self.belief_codec.beliefs_count - 1
+        )
+        return {
+            "start_value": start_value,
+            "residual": 0.0 if self.converged() else self.residual,
+            "converged": self.converged(),
+            "trials": self.trials_count,
+            "backups": self.backups_count,
+            "backed_up_pairs": len(self.values)
+        }
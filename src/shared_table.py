@@ -0,0 +1,24 @@
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class SharedTable:
+    def __init__(self, shape: tuple, dtype, order: str = "C", fill_value=None):
+        # Table in a named shared memory block, other processes attach to it by name and write it in place
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.order = order
+        self.size = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self.memory = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+        self.name = self.memory.name
+        self.array = np.ndarray(shape=self.shape, dtype=self.dtype, buffer=self.memory.buf, order=self.order)
+        # The block stays mapped as long as the array (or a view of it) is alive
+        weakref.finalize(self.array, self.memory.close)
+        if fill_value is not None:
+            self.array.fill(fill_value)
+
+    def unlink(self):
+        # Once no other process attaches anymore: the block is freed when the array is
+        self.memory.unlink()
@@ -1,6 +1,6 @@
-from agents import Agent
 from state import State
 from utility_of_states import UtilityOfStates
+from rollout import RolloutKernel
 
 
 class Simulator:
@@ -9,7 +9,7 @@ class Simulator:
         self.normal_agents_count = 1
         self.current_state = initial_state
         self.utility_of_states = utility_of_states
-        self.unknown_state = self.utility_of_states.get_initial_unknown_state()
+        self.rollout_kernel = RolloutKernel(utility_of_states=utility_of_states)
         # self.states = [self.current_state]
 
     def _goal_achieved(self):
@@ -38,6 +38,19 @@ class Simulator:
         else:
             return False
 
+    def _blocked_edges_mask(self):
+        # Unknown edges blocked in the graph instance
+        blocked_edges_mask = 0
+        for edge_idx, (first_vertex_idx, second_vertex_idx) in enumerate(self.utility_of_states.unknown_edges_keys):
+            edge_type, _ = self.current_state.get_edge_type_and_cost(
+                current_vertex=first_vertex_idx,
+                next_vertex=second_vertex_idx,
+                mode="Indices"
+            )
+            if edge_type == "always blocked":
+                blocked_edges_mask |= 1 << edge_idx
+        return blocked_edges_mask
+
     def run(self):
         agent_idx = 0
         print("# Clock Time 0.0:")
@@ -46,16 +59,29 @@ class Simulator:
         if self._goal_achieved():
             return
 
-        while True:
+        # The rollout kernel walks the policy, the state only replays its actions for printing
+        action_codes, _ = self.rollout_kernel.rollout(
+            start_idx=self.current_state.coordinates_to_vertex_index(
+                coords=self.current_state.agents[agent_idx]["location"]
+            ),
+            goal_idx=self.utility_of_states.goal_idx,
+            blocked_edges_mask=self._blocked_edges_mask()
+        )
+        self.current_state = self.current_state.clone_state()
+
+        for action_code in action_codes.tolist():
             # Perform Agent Action
-            self.current_state = self.current_state.clone_state()
-            current_agent = Agent(
-                state=self.current_state,
-                utility_of_states=self.utility_of_states,
-                unknown_state=self.unknown_state
-            )
-            self.current_state, action = current_agent.perform_action()
-            # self.states.append(self.current_state)
+            self.current_state.update_agent_packages_status()
+            if action_code < 0:
+                action = "no-op"
+            else:
+                action = self.utility_of_states.action_names[action_code]
+                self.current_state.perform_agent_action(
+                    current_vertex=self.current_state.agents[agent_idx]["location"],
+                    action=action,
+                    mode="Coords"
+                )
+                self.current_state.update_agent_packages_status()
 
             # Print Agent Action
             agent_type = self.current_state.agents[agent_idx]['type']
@@ -64,7 +90,7 @@ class Simulator:
                 self.no_op_count += 1
 
             # Raise clock by one
-            self.current_state = self.current_state.clone_state(time_factor=1)
+            self.current_state.time += 1
             self.current_state.update_packages_info()
             print(f"# Clock Time {self.current_state.time}:")
 
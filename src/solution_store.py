@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+
+class SolutionStore:
+    def __init__(self, directory: str):
+        # Solved utility tables, one file per environment: a JSON header followed by the raw value table
+        # (column major) and the action codes, mapped copy-on-write so processes share the clean pages
+        self.directory = directory
+        self.file_extension = ".solution"
+        self.magic = b"UTILSOL1"
+        self.length_bytes = 8
+        self.alignment = 64
+
+    @staticmethod
+    def environment_key(environment_data: dict):
+        # Content hash of the parsed environment (before State changes it)
+        environment_json = json.dumps(environment_data, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(environment_json.encode("utf-8")).hexdigest()
+
+    def solution_path(self, environment_key: str):
+        return os.path.join(self.directory, f"{environment_key}{self.file_extension}")
+
+    def _aligned(self, offset: int):
+        return -(-offset // self.alignment) * self.alignment
+
+    def _data_offsets(self, header_length: int, values_shape: list):
+        # Both tables start on aligned offsets after the header
+        values_offset = self._aligned(len(self.magic) + self.length_bytes + header_length)
+        codes_offset = self._aligned(values_offset + int(np.prod(values_shape)) * np.dtype(np.float64).itemsize)
+        return values_offset, codes_offset
+
+    def save(self, environment_key: str, header: dict, utility_values: np.ndarray, action_codes: np.ndarray):
+        header = dict(header)
+        header["environment_key"] = environment_key
+        header["values_shape"] = list(utility_values.shape)
+        header["codes_count"] = int(action_codes.shape[0])
+        header_bytes = json.dumps(header).encode("utf-8")
+        values_offset, codes_offset = self._data_offsets(
+            header_length=len(header_bytes),
+            values_shape=header["values_shape"]
+        )
+
+        # Written aside and moved into place, readers never see a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as solution_file:
+                solution_file.write(self.magic)
+                solution_file.write(len(header_bytes).to_bytes(self.length_bytes, byteorder="little"))
+                solution_file.write(header_bytes)
+                solution_file.seek(values_offset)
+                np.asfortranarray(utility_values, dtype=np.float64).T.tofile(solution_file)
+                solution_file.seek(codes_offset)
+                np.ascontiguousarray(action_codes, dtype=np.int8).tofile(solution_file)
+            os.replace(temporary_path, self.solution_path(environment_key=environment_key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    def read_header(self, environment_key: str):
+        # Header of the stored solution, None if there is none
+        solution_path = self.solution_path(environment_key=environment_key)
+        if not os.path.isfile(solution_path):
+            return None
+
+        with open(solution_path, "rb") as solution_file:
+            if solution_file.read(len(self.magic)) != self.magic:
+                raise ValueError(f"Invalid solution file '{solution_path}'")
+            header_length = int.from_bytes(solution_file.read(self.length_bytes), byteorder="little")
+            header = json.loads(solution_file.read(header_length).decode("utf-8"))
+
+        header["values_offset"], header["codes_offset"] = self._data_offsets(
+            header_length=header_length,
+            values_shape=header["values_shape"]
+        )
+        if header["environment_key"] != environment_key:
+            raise ValueError(f"Solution file '{solution_path}' belongs to environment '{header['environment_key']}'")
+        return header
+
+    def load(self, environment_key: str, header: dict):
+        solution_path = self.solution_path(environment_key=environment_key)
+        utility_values = np.memmap(
+            solution_path,
+            dtype=np.float64,
+            mode="c",
+            offset=header["values_offset"],
+            shape=tuple(header["values_shape"]),
+            order="F"
+        )
+        action_codes = np.memmap(
+            solution_path,
+            dtype=np.int8,
+            mode="c",
+            offset=header["codes_offset"],
+            shape=header["codes_count"]
+        )
+        return utility_values, action_codes
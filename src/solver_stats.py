@@ -0,0 +1,94 @@
+import json
+import time
+import contextlib
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+
+class SolverStats:
+    def __init__(self):
+        # Counters and phase timings of the solver. Subscribers are callables 'subscriber(event_name, event_data)'
+        # called on: 'phase_started' (phase name, total), 'phase_progress' (phase name, amount),
+        # 'phase_finished' (phase name, seconds) and 'belief_solved' (belief index, sweeps count)
+        self.counters = dict()
+        self.phase_seconds = dict()
+        self.sweeps_histogram = dict()
+        self.subscribers = list()
+
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def _notify(self, event_name: str, **event_data):
+        for subscriber in self.subscribers:
+            subscriber(event_name, event_data)
+
+    def count(self, counter_name: str, amount: int = 1):
+        self.counters[counter_name] = self.counters.get(counter_name, 0) + int(amount)
+
+    def belief_solved(self, belief_idx: int, sweeps_count: int):
+        # Fixed point sweeps a belief state took, kept as a histogram (sweeps count -> belief states count)
+        self.sweeps_histogram[sweeps_count] = self.sweeps_histogram.get(sweeps_count, 0) + 1
+        self.count(counter_name="solved_beliefs")
+        self.count(counter_name="sweeps", amount=sweeps_count)
+        self._notify("belief_solved", belief_idx=belief_idx, sweeps_count=sweeps_count)
+
+    @contextlib.contextmanager
+    def phase(self, phase_name: str, total: int = None):
+        self._notify("phase_started", phase_name=phase_name, total=total)
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - phase_start
+            self.phase_seconds[phase_name] = self.phase_seconds.get(phase_name, 0.0) + seconds
+            self._notify("phase_finished", phase_name=phase_name, seconds=seconds)
+
+    def advance(self, phase_name: str, amount: int = 1):
+        self._notify("phase_progress", phase_name=phase_name, amount=amount)
+
+    def track(self, phase_name: str, items, total: int = None):
+        # Iterates the items inside a phase, one progress step per item ('total' for items without a length)
+        with self.phase(phase_name=phase_name, total=len(items) if total is None else total):
+            for item in items:
+                yield item
+                self.advance(phase_name=phase_name)
+
+    def as_dict(self):
+        return {
+            "counters": dict(self.counters),
+            "phase_seconds": dict(self.phase_seconds),
+            "sweeps_per_belief": {
+                str(sweeps_count): beliefs_count
+                for sweeps_count, beliefs_count in sorted(self.sweeps_histogram.items())
+            }
+        }
+
+    def write_json(self, output_file):
+        json.dump(self.as_dict(), output_file, indent=4)
+
+
+class TqdmProgress:
+    def __init__(self):
+        # Subscriber drawing a progress bar per solver phase that reports a total
+        if tqdm is None:
+            raise ImportError("TqdmProgress requires the 'tqdm' package")
+        self.progress_bars = dict()
+
+    @staticmethod
+    def available():
+        return tqdm is not None
+
+    def __call__(self, event_name: str, event_data: dict):
+        phase_name = event_data.get("phase_name", None)
+        if event_name == "phase_started" and event_data["total"] is not None:
+            self.progress_bars[phase_name] = tqdm(total=event_data["total"], desc=phase_name)
+        elif event_name == "phase_progress" and phase_name in self.progress_bars:
+            self.progress_bars[phase_name].update(event_data["amount"])
+        elif event_name == "phase_finished" and phase_name in self.progress_bars:
+            self.progress_bars.pop(phase_name).close()
@@ -1,5 +1,4 @@
 import numpy as np
-from copy import deepcopy
 
 
 class State:
@@ -13,8 +12,13 @@ class State:
 
         # Build state graph
         self.total_vertices = self.X * self.Y
-        self.adjacency_matrix = None
-        self._build_adjacency_matrix()
+        self.movements = [[1, 0], [-1, 0], [0, 1], [0, -1]]
+        self.movement_indices = {tuple(movement): idx for idx, movement in enumerate(self.movements)}
+        self.edge_mask = None
+        self.edge_index = None
+        self.incident_fragile_edges = None
+        self.shared_topology = False
+        self._build_graph()
 
         # Parse state additional parameters
         self.agent_idx = environment_data.get("agent_idx", 0)
@@ -59,60 +63,196 @@ class State:
         coords = [row, col]
         return coords
 
+    @staticmethod
+    def _edge_key(first_node: int, second_node: int):
+        return (first_node, second_node) if first_node < second_node else (second_node, first_node)
+
+    def _edge_movement_index(self, current_node: int, next_node: int):
+        # Index of the movement leading from the current vertex to the next one (-1 if not neighbors)
+        current_row, current_col = divmod(current_node, self.Y)
+        next_row, next_col = divmod(next_node, self.Y)
+        return self.movement_indices.get((next_row - current_row, next_col - current_col), -1)
+
+    def _own_topology(self):
+        # Copy on write: the graph and special edges are shared with clones until one of them changes
+        if self.shared_topology:
+            self.edge_mask = self.edge_mask.copy()
+            self.special_edges = [dict(special_edge) for special_edge in self.special_edges]
+            self.shared_topology = False
+
+    def _set_edge_open(self, first_node: int, second_node: int, is_open: bool):
+        self._own_topology()
+        first_movement_idx = self._edge_movement_index(current_node=first_node, next_node=second_node)
+        second_movement_idx = self._edge_movement_index(current_node=second_node, next_node=first_node)
+        if first_movement_idx == -1:
+            raise ValueError(f"Vertices {first_node} and {second_node} are not neighbors")
+
+        if is_open:
+            self.edge_mask[first_node] |= np.uint8(1 << first_movement_idx)
+            self.edge_mask[second_node] |= np.uint8(1 << second_movement_idx)
+        else:
+            self.edge_mask[first_node] &= np.uint8(~(1 << first_movement_idx) & 0xFF)
+            self.edge_mask[second_node] &= np.uint8(~(1 << second_movement_idx) & 0xFF)
+
     def _apply_special_edges(self):
         for special_edge in self.special_edges:
             if special_edge["type"] == "always blocked":
                 first_node = self.coordinates_to_vertex_index(coords=special_edge["from"])
                 second_node = self.coordinates_to_vertex_index(coords=special_edge["to"])
+                self._set_edge_open(first_node=first_node, second_node=second_node, is_open=False)
+
+    def set_special_edges(self, special_edges: list):
+        # The edges may still be shared with clones, so this state owns copies of them (the graph is rebuilt)
+        self.special_edges = [dict(special_edge) for special_edge in special_edges]
+        self.shared_topology = False
+        self._build_graph()
+
+    def apply_map_delta(self, added_edges: list = None, removed_edges: list = None):
+        # Map edit: 'removed_edges' are special edge identifiers (the edge turns normal), 'added_edges' are special
+        # edges as parsed ('type', 'from', 'to' and 'p' if fragile), appended after the kept ones.
+        # An edge can be removed and added again in the same delta to change its type
+        removed_edges = list() if removed_edges is None else list(removed_edges)
+        special_edges = list(self.special_edges)
+        for edge_identifier in removed_edges:
+            edge_indices = [
+                special_edge_idx for special_edge_idx, special_edge in enumerate(special_edges)
+                if special_edge["identifier"] == edge_identifier
+            ]
+            if len(edge_indices) == 0:
+                raise ValueError(f"Invalid special edge: {edge_identifier}")
+            special_edges.pop(edge_indices[0])
+
+        special_edge_keys = {
+            self.edge_key(current_vertex=special_edge["from"], next_vertex=special_edge["to"], mode="Coords")
+            for special_edge in special_edges
+        }
+        for added_edge in list() if added_edges is None else added_edges:
+            if added_edge["type"] not in ["always blocked", "fragile"]:
+                raise ValueError(f"Invalid special edge type: {added_edge['type']}")
+            if added_edge["type"] == "fragile" and not 0 <= added_edge["p"] <= 1:
+                raise ValueError(f"Invalid probability '{added_edge['p']}' of fragile edge")
+
+            first_node = self.coordinates_to_vertex_index(coords=added_edge["from"])
+            second_node = self.coordinates_to_vertex_index(coords=added_edge["to"])
+            if self._edge_movement_index(current_node=first_node, next_node=second_node) == -1:
+                raise ValueError(f"Vertices {added_edge['from']} and {added_edge['to']} are not neighbors")
+            edge_key = self._edge_key(first_node=first_node, second_node=second_node)
+            if edge_key in special_edge_keys:
+                raise ValueError(f"Edge {added_edge['from']} {added_edge['to']} is already a special edge")
+            special_edge_keys.add(edge_key)
+
+            special_edge = {"type": added_edge["type"], "from": list(added_edge["from"]), "to": list(added_edge["to"])}
+            if added_edge["type"] == "fragile":
+                special_edge["p"] = float(added_edge["p"])
+            special_edge["identifier"] = (
+                f"({added_edge['from'][0]},{added_edge['from'][1]}) ({added_edge['to'][0]},{added_edge['to'][1]})"
+            )
+            special_edges.append(special_edge)
+
+        self.set_special_edges(special_edges=special_edges)
+
+    def _build_edge_index(self):
+        # Normalized vertex pair -> special edge (later edges override earlier ones on the same pair),
+        # fragile edges are also numbered by their order among the fragile edges, and listed by these
+        # ordinals on each of their ends
+        self.edge_index = dict()
+        self.incident_fragile_edges = dict()
+        fragile_idx = 0
+        for special_edge_idx, special_edge in enumerate(self.special_edges):
+            first_node = self.coordinates_to_vertex_index(coords=special_edge["from"])
+            second_node = self.coordinates_to_vertex_index(coords=special_edge["to"])
+            edge_info = {"special_edge_idx": special_edge_idx, "fragile_idx": -1}
+            if special_edge["type"] == "fragile":
+                self.incident_fragile_edges.setdefault(first_node, list()).append(fragile_idx)
+                self.incident_fragile_edges.setdefault(second_node, list()).append(fragile_idx)
+                edge_info["fragile_idx"] = fragile_idx
+                fragile_idx += 1
+            self.edge_index[self._edge_key(first_node=first_node, second_node=second_node)] = edge_info
+
+    def _build_graph(self):
+        # Per vertex bitmask of the open movements (bit i for self.movements[i]) on the 4-connected grid
+        rows, cols = np.divmod(np.arange(self.total_vertices), self.Y)
+        self.edge_mask = np.zeros(shape=self.total_vertices, dtype=np.uint8)
+        for movement_idx, movement in enumerate(self.movements):
+            inside_grid = (
+                (0 <= rows + movement[0]) & (rows + movement[0] < self.X) &
+                (0 <= cols + movement[1]) & (cols + movement[1] < self.Y)
+            )
+            self.edge_mask[inside_grid] |= np.uint8(1 << movement_idx)
 
-                self.adjacency_matrix[first_node, second_node] = 0
-                self.adjacency_matrix[second_node, first_node] = 0
+        self._apply_special_edges()
+        self._build_edge_index()
 
-    def _build_adjacency_matrix(self):
-        self.adjacency_matrix = np.zeros(shape=(self.total_vertices, self.total_vertices), dtype=int)
+    def _is_edge_open(self, current_node: int, next_node: int):
+        movement_idx = self._edge_movement_index(current_node=current_node, next_node=next_node)
+        if movement_idx == -1:
+            return False
+        return bool(self.edge_mask[current_node] & (1 << movement_idx))
 
-        for i in range(self.X):
-            for j in range(self.Y):
-                current_node = self.coordinates_to_vertex_index(coords=[i, j])
+    def edge_key(self, current_vertex, next_vertex, mode: str):
+        current_vertex_index, next_vertex_index = self.convert_to_node_indices(
+            current_vertex=current_vertex,
+            next_vertex=next_vertex,
+            mode=mode
+        )
+        return self._edge_key(first_node=current_vertex_index, second_node=next_vertex_index)
 
-                # Connect with the right neighbor (if exists)
-                if j + 1 < self.Y:
-                    right_neighbor = self.coordinates_to_vertex_index(coords=[i, j + 1])
-                    self.adjacency_matrix[current_node, right_neighbor] = 1
-                    self.adjacency_matrix[right_neighbor, current_node] = 1
+    def edge_info(self, current_vertex, next_vertex, mode: str):
+        # Edge type, cost and fragile edge ordinal (-1 if the edge was not fragile) in O(1)
+        current_vertex_index, next_vertex_index = self.convert_to_node_indices(
+            current_vertex=current_vertex,
+            next_vertex=next_vertex,
+            mode=mode
+        )
+        edge_cost = int(self._is_edge_open(current_node=current_vertex_index, next_node=next_vertex_index))
+        edge_info = self.edge_index.get(self._edge_key(first_node=current_vertex_index, second_node=next_vertex_index))
+        if edge_info is None:
+            return "normal", edge_cost, -1
 
-                # Connect with the bottom neighbor (if exists)
-                if i + 1 < self.X:
-                    bottom_neighbor = self.coordinates_to_vertex_index(coords=[i + 1, j])
-                    self.adjacency_matrix[current_node, bottom_neighbor] = 1
-                    self.adjacency_matrix[bottom_neighbor, current_node] = 1
+        edge_type = self.special_edges[edge_info["special_edge_idx"]]["type"]
+        return edge_type, edge_cost, edge_info["fragile_idx"]
 
-        self._apply_special_edges()
+    def block_edge(self, current_vertex, next_vertex, mode: str):
+        current_vertex_index, next_vertex_index = self.convert_to_node_indices(
+            current_vertex=current_vertex,
+            next_vertex=next_vertex,
+            mode=mode
+        )
+        self._set_edge_open(first_node=current_vertex_index, second_node=next_vertex_index, is_open=False)
+
+    def unblock_edge(self, current_vertex, next_vertex, mode: str):
+        current_vertex_index, next_vertex_index = self.convert_to_node_indices(
+            current_vertex=current_vertex,
+            next_vertex=next_vertex,
+            mode=mode
+        )
+        self._set_edge_open(first_node=current_vertex_index, second_node=next_vertex_index, is_open=True)
 
     def update_packages_info(self):
-        current_packages = deepcopy(self.packages)
-        for package in current_packages:
+        # Packages may be shared with cloned states, so a changed package is replaced by an updated copy
+        for package in list(self.packages):
             if package["from_time"] <= self.time:
                 self.packages.remove(package)
 
+                package = dict(package)
                 package["status"] = "placed"
 
                 self.placed_packages.append(package)
 
-        current_placed_packages = deepcopy(self.placed_packages)
-        for package in current_placed_packages:
+        for package in list(self.placed_packages):
             if package["before_time"] <= self.time:
                 self.placed_packages.remove(package)
 
+                package = dict(package)
                 package["status"] = "disappeared"
 
                 self.archived_packages.append(package)
 
-        current_picked_packages = deepcopy(self.picked_packages)
-        for package in current_picked_packages:
+        for package in list(self.picked_packages):
             if package["before_time"] <= self.time:
                 self.picked_packages.remove(package)
 
+                package = dict(package)
                 package["status"] = "disappeared"
                 package["holder_agent_id"] = -1
 
@@ -125,19 +265,18 @@ class State:
 
     def update_agent_packages_status(self):
         agent_data = self.agents[self.agent_idx]
-        current_placed_packages = deepcopy(self.placed_packages)
-        for package in current_placed_packages:
+        for package in list(self.placed_packages):
             if package["package_at"] == agent_data["location"]:
                 self.placed_packages.remove(package)
 
+                package = dict(package)
                 package["status"] = "picked"
                 package["holder_agent_id"] = self.agent_idx
 
                 agent_data["packages"].append(package)
                 self.picked_packages.append(package)
 
-        current_pickup_packages = deepcopy(self.picked_packages)
-        for package in current_pickup_packages:
+        for package in list(self.picked_packages):
             # Skip packages not picked by this agent
             if package["holder_agent_id"] != self.agent_idx:
                 continue
@@ -146,6 +285,7 @@ class State:
                 agent_data["packages"].remove(package)
                 self.picked_packages.remove(package)
 
+                package = dict(package)
                 package["status"] = "delivered"
                 agent_data["score"] += 1
 
@@ -200,11 +340,7 @@ class State:
                     return False
 
         # Check if the edge is missing
-        edge_missing_validation = (
-            self.adjacency_matrix[current_vertex_index, next_vertex_index] == 0 or
-            self.adjacency_matrix[current_vertex_index, next_vertex_index] == 0
-        )
-        if edge_missing_validation:
+        if not self._is_edge_open(current_node=current_vertex_index, next_node=next_vertex_index):
             return False
 
         # All validation passed
@@ -217,7 +353,8 @@ class State:
             mode=mode
         )
 
-        return self.adjacency_matrix[current_vertex_index, next_vertex_index]
+        # Unit cost for open edges, 0 for missing edges
+        return int(self._is_edge_open(current_node=current_vertex_index, next_node=next_vertex_index))
 
     def get_action_name(self, current_vertex, next_vertex, mode: str):
         current_vertex_coords, next_vertex_coords = self.convert_to_node_coords(
@@ -243,16 +380,12 @@ class State:
         )
         if self.is_path_available(current_vertex=current_vertex_coords, next_vertex=next_vertex_coords, mode="Coords"):
             # Break fragile edges
-            for edge_idx, edge in enumerate(self.special_edges):
-                fragile_edge_step_validation = (
-                    edge["type"] == "fragile" and (
-                        (edge["from"] == current_vertex_coords and edge["to"] == next_vertex_coords) or
-                        (edge["from"] == next_vertex_coords and edge["to"] == current_vertex_coords)
-                    )
-                )
-                if fragile_edge_step_validation:
-                    self.special_edges[edge_idx]["type"] = "always blocked"
-                    self._build_adjacency_matrix()
+            edge_key = self.edge_key(current_vertex=current_vertex_coords, next_vertex=next_vertex_coords, mode="Coords")
+            edge_info = self.edge_index.get(edge_key)
+            if edge_info is not None and self.special_edges[edge_info["special_edge_idx"]]["type"] == "fragile":
+                self._own_topology()
+                self.special_edges[edge_info["special_edge_idx"]]["type"] = "always blocked"
+                self.block_edge(current_vertex=current_vertex_coords, next_vertex=next_vertex_coords, mode="Coords")
 
             # Update agent data
             agent_data = self.agents[self.agent_idx]
@@ -295,22 +428,7 @@ class State:
         )
 
     def get_edge_type_and_cost(self, current_vertex, next_vertex, mode: str):
-        current_vertex_coords, next_vertex_coords = self.convert_to_node_coords(
-            current_vertex=current_vertex,
-            next_vertex=next_vertex,
-            mode=mode
-        )
-
-        edge_type = "normal"
-        for edge in self.special_edges:
-            if edge["from"] == current_vertex_coords and edge["to"] == next_vertex_coords:
-                edge_type = edge["type"]
-            elif edge["from"] == next_vertex_coords and edge["to"] == current_vertex_coords:
-                edge_type = edge["type"]
-            else:
-                continue
-
-        edge_cost = self.edge_cost(current_vertex=current_vertex_coords, next_vertex=next_vertex_coords, mode="Coords")
+        edge_type, edge_cost, _ = self.edge_info(current_vertex=current_vertex, next_vertex=next_vertex, mode=mode)
         return edge_type, edge_cost
 
     @staticmethod
@@ -388,16 +506,28 @@ class State:
         return print_data
 
     def clone_state(self, agent_idx: int = 0, time_factor: float = 0):
-        environment_data = {
-            "x": self.X - 1,
-            "y": self.Y - 1,
-            "packages": deepcopy(self.packages),
-            "special_edges": deepcopy(self.special_edges),
-            "agents": deepcopy(self.agents),
-            "agent_idx": agent_idx,
-            "time": self.time + time_factor,
-            "placed_packages": deepcopy(self.placed_packages),
-            "picked_packages": deepcopy(self.picked_packages),
-            "archived_packages": deepcopy(self.archived_packages)
-        }
-        return State(environment_data=environment_data)
+        # Structural sharing: the grid topology is shared (copy on write), only the small mutable
+        # parts are copied, and a cloned state is valid so the initialization validations are skipped
+        cloned_state = State.__new__(State)
+        cloned_state.X = self.X
+        cloned_state.Y = self.Y
+        cloned_state.total_vertices = self.total_vertices
+        cloned_state.movements = self.movements
+        cloned_state.movement_indices = self.movement_indices
+
+        self.shared_topology = True
+        cloned_state.shared_topology = True
+        cloned_state.edge_mask = self.edge_mask
+        cloned_state.special_edges = self.special_edges
+        cloned_state.edge_index = self.edge_index
+        cloned_state.incident_fragile_edges = self.incident_fragile_edges
+
+        cloned_state.packages = list(self.packages)
+        cloned_state.agents = [dict(agent, packages=list(agent.get("packages", list()))) for agent in self.agents]
+        cloned_state.agent_idx = agent_idx
+        cloned_state.time = self.time + time_factor
+        cloned_state.placed_packages = list(self.placed_packages)
+        cloned_state.picked_packages = list(self.picked_packages)
+        cloned_state.archived_packages = list(self.archived_packages)
+        cloned_state.update_packages_info()
+        return cloned_state
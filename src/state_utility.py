@@ -1,28 +1,74 @@
-import itertools
-from typing import Callable
+import numpy as np
+
+from belief_codec import BeliefCodec
+from action_table import ActionTable
 
 
 class StateUtility:
-    def __init__(self, location: list, unknown_edges_func: Callable, initial_value=None):
+    def __init__(self,
+                 location: list,
+                 vertex_idx: int,
+                 utility_values: np.ndarray,
+                 utility_actions: ActionTable,
+                 belief_codec: BeliefCodec,
+                 action_names: list):
+        # View over a single vertex row of the utility table
         self.location = location
-        self.unknown_edges_func = unknown_edges_func
-        self.edge_states = ["T", "F", "U"]
-        self.utilities = dict()
+        self.vertex_idx = vertex_idx
+        self.utility_values = utility_values
+        self.utility_actions = utility_actions
+        self.belief_codec = belief_codec
+        self.action_names = action_names
+        self.edge_states = belief_codec.edge_states
+
+    def action_code(self, action):
+        return -1 if action is None else self.action_names.index(action)
+
+    def action_name(self, action_code: int):
+        return None if action_code < 0 else self.action_names[action_code]
 
-        self._set_initial_values(initial_value=initial_value)
+    def utility_value_and_action(self, unknown_state: list):
+        try:
+            belief_idx = self.belief_codec.first_matching_index(unknown_state=unknown_state)
+        except ValueError:
+            raise ValueError(f"Unknown state '{unknown_state}' for location '{self.location}'")
 
-    def _set_initial_values(self, initial_value):
-        unknown_edges = self.unknown_edges_func()
-        iter_product = itertools.product(self.edge_states, repeat=len(unknown_edges))
-        for product in iter_product:
-            product_str = str(list(product))
-            self.utilities[product_str] = {
-                "value": initial_value,
-                "optimal_action": None,
-            }
+        value = self.utility_values[self.vertex_idx, belief_idx]
+        action_code = self.utility_actions.fetch(vertex_indices=self.vertex_idx, belief_indices=belief_idx)
+        action = self.action_name(action_code=int(action_code))
+        return value, action
 
-    @staticmethod
-    def _compare_states_format(state1: list, state2: list):
+    def update_utility_value(self, unknown_state: list, value: float, action=None):
+        action_code = self.action_code(action=action)
+
+        # Concrete belief state: direct index
+        if self.belief_codec.is_concrete(unknown_state=unknown_state):
+            belief_idx = self.belief_codec.encode(unknown_state=unknown_state)
+            if self.utility_values[self.vertex_idx, belief_idx] < value:
+                self.utility_values[self.vertex_idx, belief_idx] = value
+                self.utility_actions.store(
+                    vertex_indices=self.vertex_idx,
+                    belief_indices=belief_idx,
+                    action_codes=action_code
+                )
+                return True
+            return False
+
+        # Wildcard belief state: only the matching entries
+        belief_indices = self.belief_codec.matching_indices(unknown_state=unknown_state)
+        current_values = self.utility_values[self.vertex_idx, belief_indices]
+        improved_indices = belief_indices[current_values < value]
+        self.utility_values[self.vertex_idx, improved_indices] = value
+        self.utility_actions.store(
+            vertex_indices=self.vertex_idx,
+            belief_indices=improved_indices,
+            action_codes=action_code
+        )
+        return len(improved_indices) > 0
+
+
+if __name__ == '__main__':
+    def compare_states_format(state1: list, state2: list):
         if len(state1) != len(state2):
             raise Exception("States must have same length")
 
@@ -39,51 +85,7 @@ class StateUtility:
                 compare_result = False
         return compare_result
 
-    def update_utility_value(self, unknown_state: list, value: float, action=None):
-        success_update = False
-        unknown_edges = self.unknown_edges_func()
-        iter_product = itertools.product(self.edge_states, repeat=len(unknown_edges))
-        for product in iter_product:
-            product_lst = list(product)
-            if self._compare_states_format(product_lst, unknown_state):
-                product_str = str(product_lst)
-                current_value = self.utilities[product_str]["value"]
-                if current_value >= value:
-                    # print(
-                    #     f"Failed to update location '{self.location}' utility state '{product_str}': "
-                    #     f"new value: {value}, current value: {current_value}."
-                    # )
-                    continue
-                else:
-                    self.utilities[product_str]["value"] = value
-                    self.utilities[product_str]["optimal_action"] = action
-                    success_update = True
-            else:
-                continue
-
-        return success_update
-
-    def utility_value_and_action(self, unknown_state: list):
-        value = None
-        action = None
-        unknown_edges = self.unknown_edges_func()
-        iter_product = itertools.product(self.edge_states, repeat=len(unknown_edges))
-        for product in iter_product:
-            product_lst = list(product)
-            if self._compare_states_format(product_lst, unknown_state):
-                product_str = str(product_lst)
-                value = self.utilities[product_str]["value"]
-                action = self.utilities[product_str]["optimal_action"]
-                break
-
-        if value is not None:
-            return value, action
-        else:
-            raise ValueError(f"Unknown state '{unknown_state}' for location '{self.location}'")
-
-
-if __name__ == '__main__':
-    result1 = StateUtility._compare_states_format(state1=["X", "X", "X"], state2=["T", "F", "U"])
-    result2 = StateUtility._compare_states_format(state1=["K", "K"], state2=["T", "F"])
+    result1 = compare_states_format(state1=["X", "X", "X"], state2=["T", "F", "U"])
+    result2 = compare_states_format(state1=["K", "K"], state2=["T", "F"])
     print(result1)
     print(result2)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class TransitionModel:
+    def __init__(self,
+                 successors: np.ndarray,
+                 costs: np.ndarray,
+                 fragile_ids: np.ndarray,
+                 fragile_probabilities: list):
+        # Flat (vertex, move) tables: successor vertex ('-1' if the move is not available),
+        # edge cost and fragile edge index ('-1' for normal edges)
+        self.successors = successors
+        self.costs = costs
+        self.fragile_ids = fragile_ids
+        self.fragile_probabilities = np.array(fragile_probabilities, dtype=np.float64)
+        self.vertices_count, self.moves_count = successors.shape
+        self.fragile_edges_count = len(self.fragile_probabilities)
+
+        vertex_indices = np.arange(self.vertices_count)
+        self.edge_open = successors >= 0
+        # Whether the successor comes later than the vertex in a row-major sweep
+        self.successor_after = successors > vertex_indices[:, None]
+
+        # Move-major copies (moves, vertices): reductions over the moves run over contiguous rows
+        self.move_successors = np.ascontiguousarray(successors.T)
+        self.move_costs = np.ascontiguousarray(costs.T)
+        self.move_fragile_ids = np.ascontiguousarray(fragile_ids.T)
+        self.move_edge_open = np.ascontiguousarray(self.edge_open.T)
+        self.move_successor_after = np.ascontiguousarray(self.successor_after.T)
+
+        # Alternative moves of each move (used when an unknown edge turns out blocked), and their successors
+        self.alternative_moves = np.array([
+            [alternative_move_idx for alternative_move_idx in range(self.moves_count) if alternative_move_idx != move_idx]
+            for move_idx in range(self.moves_count)
+        ], dtype=np.int64)
+        self.alternative_successors = successors[:, self.alternative_moves]
+
+        # Vertex and move of both ends of each fragile edge ('-1' if it is never traversable)
+        self.fragile_endpoints = np.full(shape=(self.fragile_edges_count, 2), fill_value=-1, dtype=np.int64)
+        self.fragile_moves = np.full(shape=(self.fragile_edges_count, 2), fill_value=-1, dtype=np.int64)
+        for vertex_idx, move_idx in zip(*np.nonzero(fragile_ids >= 0)):
+            fragile_idx = fragile_ids[vertex_idx, move_idx]
+            edge_end = 0 if self.fragile_endpoints[fragile_idx, 0] < 0 else 1
+            self.fragile_endpoints[fragile_idx, edge_end] = vertex_idx
+            self.fragile_moves[fragile_idx, edge_end] = move_idx
+
+    @staticmethod
+    def gather(values: np.ndarray, successors: np.ndarray, fill_value):
+        # Successor values of every (vertex, move), 'fill_value' where the move is not available.
+        # Leading axes of 'values' are batches, the last one is vertices
+        extended_values = np.concatenate(
+            [values, np.full(shape=values.shape[:-1] + (1,), fill_value=fill_value, dtype=values.dtype)],
+            axis=-1
+        )
+        return extended_values[..., successors]
@@ -1,17 +1,31 @@
 from state import State
 from state_utility import StateUtility
-
+from belief_codec import BeliefCodec
+from backup_engine import BackupEngine
+from transition_model import TransitionModel
+from action_table import ActionTable
+from parallel_solver import ParallelSolver
+from lazy_solver import LazySolver
+from prioritized_solver import PrioritizedSolver
+from rtdp_solver import RtdpSolver
+from solution_store import SolutionStore
+from disk_table import DiskTable
+from shared_table import SharedTable
+from policy_graph import PolicyGraph
+from solver_stats import SolverStats, TqdmProgress
+
+import os
 import itertools
 import numpy as np
-from copy import deepcopy
-from tqdm import tqdm
 
 
 class UtilityOfStates:
-    def __init__(self, initial_state: State):
+    def __init__(self, initial_state: State, show_progress: bool = True):
         # Define constants
         self.policy_bulk = "->"
         self.possible_moves = [[1, 0], [-1, 0], [0, 1], [0, -1]]
+        # Action codes stored in the utility table are indices into this list ('-1' means no action)
+        self.action_names = ["Down", "Up", "Right", "Left", "no-op"]
 
         # Remove agent location for checking available paths
         self.state = initial_state.clone_state()
@@ -19,8 +33,37 @@ class UtilityOfStates:
 
         # Define auxiliary variables
         self.unknown_edges = [edge for edge in self.state.special_edges if edge["type"] == "fragile"]
-        self.unknown_edges_func = lambda: self.unknown_edges
-        self.states_utilities = dict()
+        self.unknown_edge_index = dict()
+        self.unknown_edges_keys = list()
+        self.incident_unknown_edges = dict()
+        self._build_unknown_edge_index()
+        self.belief_codec = BeliefCodec(edges_count=len(self.unknown_edges))
+        self.utility_values = None
+        self.utility_actions = None
+        self.table_directory = None
+        self.disk_tables = dict()
+        self.shared_tables = dict()
+        self.table_chunk_size = 4096
+        self.states_utilities = list()
+        self.goal_idx = None
+        self.transition_model = None
+        self.backup_engine = None
+        self.lazy_solver = None
+        self.rtdp_solver = None
+        self.rtdp_options = dict()
+
+        # Counters and phase timings, progress bars are one optional subscriber
+        self.solver_stats = SolverStats()
+        if show_progress and TqdmProgress.available():
+            self.solver_stats.subscribe(TqdmProgress())
+
+        self.solver_modes = {
+            "sequential": self._solve_sequential,
+            "parallel": self._solve_parallel,
+            "lazy": self._solve_lazy,
+            "prioritized": self._solve_prioritized,
+            "rtdp": self._solve_rtdp
+        }
 
         self.all_packages = (
             self.state.packages +
@@ -29,359 +72,873 @@ class UtilityOfStates:
             self.state.archived_packages
         )
 
-    def _set_initial_values(self, goal_location: list):
-        X = self.state.X
-        Y = self.state.Y
-        all_vertices = [list(vertex) for vertex in itertools.product(range(X), range(Y))]
-        for vertex in all_vertices:
-            self.states_utilities[str(vertex)] = StateUtility(
-                location=vertex,
-                unknown_edges_func=self.unknown_edges_func,
-                initial_value=-np.inf
+    def _set_initial_values(self, shared: bool = False):
+        # Utility table: one row per vertex, one column per belief state (columns are contiguous).
+        # Values of every pair are kept since the backups look them up, actions only of the consistent pairs.
+        # 'shared': in memory tables go in shared memory, for the parallel solver workers
+        table_shape = (self.state.total_vertices, self.belief_codec.beliefs_count)
+        self.disk_tables = dict()
+        self.shared_tables = dict()
+        self.utility_values = self._allocate_table(
+            table_name="utility_values",
+            shape=table_shape,
+            dtype=np.float64,
+            order="F",
+            fill_value=-np.inf,
+            shared=shared
+        )
+        self.utility_actions = ActionTable(
+            vertices_count=self.state.total_vertices,
+            belief_codec=self.belief_codec,
+            edge_endpoints=self.unknown_edges_keys,
+            codes_allocator=lambda codes_count: self._allocate_table(
+                table_name="utility_actions",
+                shape=(codes_count,),
+                dtype=np.int8,
+                order="C",
+                fill_value=-1,
+                shared=shared
             )
-
-        # Set goal state utility
-        self.states_utilities[str(goal_location)].update_utility_value(
-            unknown_state=["X"] * len(self.unknown_edges),
-            value=0.0,
-            action="no-op"
         )
-
-    def _check_edge_state(self, fragile_edge: dict, unknown_state: list):
-        for idx, unknown_edge in enumerate(self.unknown_edges):
-            if unknown_edge["from"] == fragile_edge["from"] and unknown_edge["to"] == fragile_edge["to"]:
-                return unknown_state[idx], idx
-            elif unknown_edge["from"] == fragile_edge["to"] and unknown_edge["to"] == fragile_edge["from"]:
-                return unknown_state[idx], idx
-            else:
-                continue
-
-        raise Exception("Edge not found in unknown edges (fragile edges)")
-
-    def _find_alternative_new_locations(self, current_location: list, current_move: list, unknown_state: list):
-        alternative_new_locations = list()
-
-        for alternative_move in self.possible_moves:
-            if alternative_move == current_move:
-                continue
-
-            new_location = [current_location[0] + alternative_move[0], current_location[1] + alternative_move[1]]
-
-            # Validate if the new location is a vertex on the graph
-            try:
-                self.state.coordinates_to_vertex_index(coords=new_location)
-            except:
-                continue
-
-            path_status = self.state.is_path_available(
-                current_vertex=current_location,
-                next_vertex=new_location,
+        self._build_states_utilities()
+
+        # Set goal state utility, in chunks of belief states (the goal row spans every page of the table)
+        for chunk_start in range(0, self.belief_codec.beliefs_count, self.table_chunk_size):
+            chunk_end = min(chunk_start + self.table_chunk_size, self.belief_codec.beliefs_count)
+            belief_indices = np.arange(chunk_start, chunk_end)
+            self.utility_values[self.goal_idx, belief_indices] = 0.0
+            self.utility_actions.store(
+                vertex_indices=self.goal_idx,
+                belief_indices=belief_indices,
+                action_codes=self.action_names.index("no-op")
+            )
+            self._release_tables()
+
+    def _allocate_table(self, table_name: str, shape: tuple, dtype, order: str, fill_value, shared: bool = False):
+        # In memory (shared memory if 'shared'), or in a memory mapped file when a table directory is set
+        if self.table_directory is None and shared:
+            self.shared_tables[table_name] = SharedTable(shape=shape, dtype=dtype, order=order, fill_value=fill_value)
+            return self.shared_tables[table_name].array
+        if self.table_directory is None:
+            return np.full(shape=shape, fill_value=fill_value, dtype=dtype, order=order)
+
+        os.makedirs(self.table_directory, exist_ok=True)
+        self.disk_tables[table_name] = DiskTable(
+            path=os.path.join(self.table_directory, f"{table_name}.bin"),
+            shape=shape,
+            dtype=dtype,
+            order=order,
+            fill_value=fill_value
+        )
+        return self.disk_tables[table_name].array
+
+    def _release_tables(self):
+        # Disk tables: written back once a layer is solved, only the layers still needed are read back
+        for disk_table in self.disk_tables.values():
+            disk_table.release()
+
+    def _build_states_utilities(self):
+        self.states_utilities = list()
+        for vertex_idx in range(self.state.total_vertices):
+            self.states_utilities.append(StateUtility(
+                location=self.state.vertex_index_to_coordinates(idx=vertex_idx),
+                vertex_idx=vertex_idx,
+                utility_values=self.utility_values,
+                utility_actions=self.utility_actions,
+                belief_codec=self.belief_codec,
+                action_names=self.action_names
+            ))
+
+    def _build_unknown_edge_index(self):
+        # Normalized vertex pair -> unknown (fragile) edge index, the unknown edges incident to each vertex are
+        # those of the state edge index
+        self.incident_unknown_edges = self.state.incident_fragile_edges
+        for edge_idx, unknown_edge in enumerate(self.unknown_edges):
+            edge_key = self.state.edge_key(
+                current_vertex=unknown_edge["from"],
+                next_vertex=unknown_edge["to"],
                 mode="Coords"
             )
-            if path_status:
-                edge_type, edge_cost = self.state.get_edge_type_and_cost(
-                    current_vertex=current_location,
-                    next_vertex=new_location,
-                    mode="Coords"
-                )
-                edge_state = "F"
-                if edge_type == "fragile":
-                    fragile_edge = {"from": current_location, "to": new_location}
-                    edge_state, _ = self._check_edge_state(
-                        fragile_edge=fragile_edge,
-                        unknown_state=unknown_state
-                    )
-
-                if edge_state == "T":
-                    continue
-                elif edge_state == "F":
-                    alternative_new_locations.append(new_location)
-                elif edge_state == "U":
-                    continue
+            self.unknown_edge_index[edge_key] = edge_idx
+            self.unknown_edges_keys.append(edge_key)
+
+    def compile_transition_model(self):
+        # Flat (vertex, move) tables built once per map, the backups only read from them
+        vertices_count = self.state.total_vertices
+        vertex_indices = np.arange(vertices_count)
+        tables_shape = (vertices_count, len(self.possible_moves))
+        successors = np.full(shape=tables_shape, fill_value=-1, dtype=np.int64)
+        fragile_ids = np.full(shape=tables_shape, fill_value=-1, dtype=np.int64)
+
+        for move_idx, possible_move in enumerate(self.possible_moves):
+            movement_idx = self.state.movement_indices[tuple(possible_move)]
+            open_edges = (self.state.edge_mask & np.uint8(1 << movement_idx)) > 0
+            successors[open_edges, move_idx] = (
+                vertex_indices[open_edges] + possible_move[0] * self.state.Y + possible_move[1]
+            )
 
-        return alternative_new_locations
+        for edge_key, edge_idx in self.unknown_edge_index.items():
+            first_vertex_idx, second_vertex_idx = edge_key
+            for current_vertex_idx, next_vertex_idx in [edge_key, (second_vertex_idx, first_vertex_idx)]:
+                fragile_ids[current_vertex_idx, successors[current_vertex_idx] == next_vertex_idx] = edge_idx
 
-    def _update_utilities_under_unknown_state(self, unknown_state: list):
-        success_update = True
+        # Unit cost for every available move (see State.edge_cost)
+        costs = (successors >= 0).astype(np.float64)
 
-        while success_update:
-            success_update = False
+        return TransitionModel(
+            successors=successors,
+            costs=costs,
+            fragile_ids=fragile_ids,
+            fragile_probabilities=[unknown_edge["p"] for unknown_edge in self.unknown_edges]
+        )
 
-            for vertex in self.states_utilities.keys():
-                state_utility = self.states_utilities[vertex]
-                current_location = state_utility.location
+    def _update_utilities_under_known_states(self, belief_indices: np.ndarray):
+        # All the known states have the same number of blocked edges, their parents are already solved
+        unsolved_beliefs = list()
+        for belief_idx in belief_indices.tolist():
+            parent_idx = self.backup_engine.unaffected_parent(belief_idx=belief_idx)
+            if parent_idx is not None:
+                self.backup_engine.copy_belief(source_belief_idx=parent_idx, target_belief_idx=belief_idx)
+            else:
+                unsolved_beliefs.append(belief_idx)
+
+        self.backup_engine.solve_known_beliefs(belief_indices=unsolved_beliefs)
+        self.backup_engine.keep_settle_sweeps(belief_indices=belief_indices.tolist())
+
+    def _update_utilities_under_unknown_state(self, belief_idx: int):
+        sweeps_count = self.backup_engine.solve_belief(belief_idx=belief_idx)
+        self.solver_stats.belief_solved(belief_idx=belief_idx, sweeps_count=sweeps_count)
+
+    def _engine_counters(self):
+        return {
+            "backups": self.backup_engine.backups_count,
+            "improvements": self.backup_engine.improvements_count,
+            "copied_beliefs": self.backup_engine.copied_beliefs_count
+        }
+
+    def _count_engine_work(self, engine_counters: dict):
+        # Work of the backup engine since 'engine_counters' were taken
+        for counter_name, counter_value in self._engine_counters().items():
+            self.solver_stats.count(counter_name=counter_name, amount=counter_value - engine_counters[counter_name])
+
+    def _belief_layers(self, edge_states: list, layer_edge_state: str, first_layer: int = 0):
+        # Belief state indices over the given edge states, one layer per count of 'layer_edge_state' (ascending).
+        # A layer is only generated when it is reached, so the layers are never all held at once
+        for layer_count in range(first_layer, self.belief_codec.edges_count + 1):
+            yield self.belief_codec.layer_indices(
+                edge_states=edge_states,
+                layer_edge_state=layer_edge_state,
+                layer_count=layer_count
+            )
 
-                for possible_move in self.possible_moves:
-                    new_location = [current_location[0] + possible_move[0], current_location[1] + possible_move[1]]
+    def _unknown_beliefs_count(self):
+        # Every belief state with an unknown edge
+        return self.belief_codec.beliefs_count - 2 ** self.belief_codec.edges_count
+
+    def _prepare_utility_table(self, shared: bool = False):
+        # Dense utility table solved by the backups, returns the belief states layers in solving order (generators)
+        with self.solver_stats.phase(phase_name="table_preparation"):
+            self._set_initial_values(shared=shared)
+            self.backup_engine = BackupEngine(
+                transition_model=self.transition_model,
+                goal_idx=self.goal_idx,
+                belief_codec=self.belief_codec,
+                utility_values=self.utility_values,
+                utility_actions=self.utility_actions
+            )
 
-                    # Validate if the new location is a vertex on the graph
-                    try:
-                        self.state.coordinates_to_vertex_index(coords=new_location)
-                    except:
-                        continue
+            # Known states (no unknown edges) by blocked edges count, then unknown states by unknown edges count.
+            # A belief state only depends on belief states of earlier layers
+            known_layers = self._belief_layers(edge_states=["F", "T"], layer_edge_state="T")
+            unknown_layers = self._belief_layers(edge_states=["F", "T", "U"], layer_edge_state="U", first_layer=1)
+        return known_layers, unknown_layers
+
+    def _solve_known_layers(self, known_layers: list):
+        # Update utilities under known states, layer by layer of blocked edges count.
+        # The work is counted inside the phase, so the phase subscribers see it
+        engine_counters = self._engine_counters()
+        with self.solver_stats.phase(phase_name="known_layers", total=self.belief_codec.edges_count + 1):
+            for known_layer in known_layers:
+                self._update_utilities_under_known_states(belief_indices=known_layer)
+                self._release_tables()
+                self.solver_stats.advance(phase_name="known_layers")
+            self.backup_engine.keep_settle_sweeps(belief_indices=list())
+            self._count_engine_work(engine_counters=engine_counters)
+
+    def _solve_unknown_layers(self, unknown_layers, beliefs_count: int):
+        # Update utilities under unknown states, layer by layer of unknown edges count
+        engine_counters = self._engine_counters()
+        with self.solver_stats.phase(phase_name="unknown_layers", total=beliefs_count):
+            for unknown_layer in unknown_layers:
+                for belief_idx in unknown_layer.tolist():
+                    self._update_utilities_under_unknown_state(belief_idx=belief_idx)
+                    self.solver_stats.advance(phase_name="unknown_layers")
+                self._release_tables()
+            self._count_engine_work(engine_counters=engine_counters)
+
+    def _solve_sequential(self):
+        known_layers, unknown_layers = self._prepare_utility_table()
+        self._solve_known_layers(known_layers=known_layers)
+        self._solve_unknown_layers(unknown_layers=unknown_layers, beliefs_count=self._unknown_beliefs_count())
+
+    def _solve_parallel(self, workers_count: int = None):
+        # The tables are allocated where the workers attach to them: in shared memory, or the disk table files
+        known_layers, unknown_layers = self._prepare_utility_table(shared=True)
+
+        # The known layers reuse their solved parents, whose settle sweeps stay in this process. They are
+        # 2^k unit-cost BFS solved in batches, so only the 3^k - 2^k unknown belief states go to the workers
+        self._solve_known_layers(known_layers=known_layers)
+
+        table_names = ["utility_values", "utility_actions"]
+        if len(self.shared_tables) > 0:
+            table_sources = tuple(("shared_memory", self.shared_tables[name].name) for name in table_names)
+        else:
+            table_sources = tuple(("file", self.disk_tables[name].path) for name in table_names)
+        parallel_solver = ParallelSolver(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            utility_values=self.utility_values,
+            utility_actions=self.utility_actions,
+            table_sources=table_sources,
+            workers_count=workers_count
+        )
+        try:
+            parallel_solver.solve(
+                unknown_layers=unknown_layers,
+                beliefs_count=self._unknown_beliefs_count(),
+                solver_stats=self.solver_stats
+            )
+        finally:
+            # No worker attaches anymore, the shared memory is freed with the tables
+            for shared_table in self.shared_tables.values():
+                shared_table.unlink()
+
+    def _solve_prioritized(self):
+        known_layers, unknown_layers = self._prepare_utility_table()
+        self._solve_known_layers(known_layers=known_layers)
+
+        # Unknown states by prioritized sweeping, one backward search per belief state
+        prioritized_solver = PrioritizedSolver(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            goal_action_code=self.action_names.index("no-op"),
+            utility_values=self.utility_values,
+            utility_actions=self.utility_actions
+        )
+        unknown_states_count = self._unknown_beliefs_count()
+        with self.solver_stats.phase(phase_name="unknown_layers", total=unknown_states_count):
+            for unknown_layer in unknown_layers:
+                for belief_idx in unknown_layer.tolist():
+                    prioritized_solver.solve_belief(belief_idx=belief_idx)
+                    self.solver_stats.advance(phase_name="unknown_layers")
+                self._release_tables()
+
+            # A backup is a relaxation of a move into a settled vertex or an evaluated exit
+            self.solver_stats.count(counter_name="solved_beliefs", amount=unknown_states_count)
+            self.solver_stats.count(
+                counter_name="backups",
+                amount=prioritized_solver.relaxations_count + prioritized_solver.evaluated_exits_count
+            )
+            self.solver_stats.count(counter_name="improvements", amount=prioritized_solver.settled_count)
+
+    def _solve_lazy(self):
+        # No table: values are solved when they are looked up
+        self.lazy_solver = LazySolver(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            goal_action_code=self.action_names.index("no-op")
+        )
 
-                    path_status = self.state.is_path_available(
-                        current_vertex=current_location,
-                        next_vertex=new_location,
-                        mode="Coords"
-                    )
-                    if path_status:
-                        edge_type, edge_cost = self.state.get_edge_type_and_cost(
-                            current_vertex=current_location,
-                            next_vertex=new_location,
-                            mode="Coords"
-                        )
-                        edge_state = "F"
-                        edge_idx = None
-                        if edge_type == "fragile":
-                            fragile_edge = {"from": current_location, "to": new_location}
-                            edge_state, edge_idx = self._check_edge_state(
-                                fragile_edge=fragile_edge,
-                                unknown_state=unknown_state
-                            )
+    def _solve_rtdp(self, time_budget: float = None, backups_budget: int = None, seed: int = None,
+                    epsilon: float = 1e-9):
+        # No table: an anytime policy from the initial belief state, within the time (seconds) and backups budgets
+        self.rtdp_options = dict(time_budget=time_budget, backups_budget=backups_budget, seed=seed, epsilon=epsilon)
+        self.rtdp_solver = RtdpSolver(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            goal_action_code=self.action_names.index("no-op"),
+            start_idx=self.state.coordinates_to_vertex_index(coords=self.all_packages[0]["package_at"]),
+            seed=seed,
+            epsilon=epsilon
+        )
+        self.improve_policy(time_budget=time_budget, backups_budget=backups_budget)
+
+    def improve_policy(self, time_budget: float = None, backups_budget: int = None):
+        # Keeps running the trials of the rtdp solver mode (until converged if there is no budget)
+        if self.rtdp_solver is None:
+            raise ValueError("Only the rtdp solver mode improves its policy")
+
+        backups_count, trials_count = self.rtdp_solver.backups_count, self.rtdp_solver.trials_count
+        with self.solver_stats.phase(phase_name="rtdp_trials"):
+            self.rtdp_solver.solve(time_budget=time_budget, backups_budget=backups_budget)
+            self.solver_stats.count(counter_name="backups", amount=self.rtdp_solver.backups_count - backups_count)
+            self.solver_stats.count(counter_name="rtdp_trials", amount=self.rtdp_solver.trials_count - trials_count)
+
+    def convergence_estimate(self):
+        # Bellman residual of the current policy, '0' for the exact solver modes
+        if self.rtdp_solver is None:
+            return {"residual": 0.0, "converged": True}
+        return self.rtdp_solver.convergence()
+
+    def preform_value_iteration(self, solver_mode: str = "sequential", table_directory: str = None, **solver_options):
+        solve = self.solver_modes.get(solver_mode, None)
+        if solve is None:
+            raise ValueError(f"Invalid solver mode '{solver_mode}', expected one of: {list(self.solver_modes)}")
+
+        self.table_directory = table_directory
+        with self.solver_stats.phase(phase_name="value_iteration"):
+            self._prepare_model()
+            solve(**solver_options)
+
+    def update_edge_probabilities(self, edge_probabilities: dict):
+        # Fragile edge identifier -> new blocked probability. Known belief states do not depend on the probabilities
+        # and an unknown belief state only on those of its unknown edges, so only the unknown belief states with a
+        # changed unknown edge are solved again, layer by layer (the initial state given here keeps its edges)
+        edge_indices = {unknown_edge["identifier"]: idx for idx, unknown_edge in enumerate(self.unknown_edges)}
+        changed_edges = dict()
+        for edge_identifier, p in edge_probabilities.items():
+            edge_idx = edge_indices.get(edge_identifier, None)
+            if edge_idx is None:
+                raise ValueError(f"Invalid fragile edge: {edge_identifier}")
+            if not 0 <= p <= 1:
+                raise ValueError(f"Invalid probability '{p}' of fragile edge: {edge_identifier}")
+            if p != self.unknown_edges[edge_idx]["p"]:
+                changed_edges[edge_idx] = float(p)
+        if len(changed_edges) == 0:
+            return
+
+        changed_identifiers = {self.unknown_edges[edge_idx]["identifier"]: p for edge_idx, p in changed_edges.items()}
+        self.state.set_special_edges(special_edges=[
+            dict(special_edge, p=changed_identifiers[special_edge["identifier"]])
+            if special_edge["type"] == "fragile" and special_edge["identifier"] in changed_identifiers else special_edge
+            for special_edge in self.state.special_edges
+        ])
+        self.unknown_edges = [edge for edge in self.state.special_edges if edge["type"] == "fragile"]
+        self.solver_stats.count(counter_name="probability_updates")
+
+        # Not solved yet
+        if self.transition_model is None:
+            return
+
+        for edge_idx, p in changed_edges.items():
+            self.transition_model.fragile_probabilities[edge_idx] = p
+        if self.lazy_solver is not None:
+            self._solve_lazy()
+            return
+        if self.rtdp_solver is not None:
+            self._solve_rtdp(**self.rtdp_options)
+            return
+
+        # Every belief state where a changed edge is unknown, out of those with no changed edge unknown
+        kept_beliefs_count = 2 ** len(changed_edges) * 3 ** (self.belief_codec.edges_count - len(changed_edges))
+        self._solve_unknown_layers(
+            unknown_layers=self._affected_unknown_layers(changed_edges=changed_edges),
+            beliefs_count=self.belief_codec.beliefs_count - kept_beliefs_count
+        )
 
-                        # If the edge state is blocked, continue to the next move
-                        if edge_state == "T":
-                            continue
-                        # If the edge state is unblocked, calculate the new value
-                        elif edge_state == "F":
-                            next_location_value, _ = (
-                                self.states_utilities[str(new_location)].utility_value_and_action(
-                                    unknown_state=unknown_state
-                                )
+    def _affected_unknown_layers(self, changed_edges: dict):
+        # Unknown belief states where a changed edge is still unknown, layer by layer. The backups only raise values,
+        # so the belief states of a layer start over from the initial values when the layer is reached
+        unknown_digit = self.belief_codec.edge_state_digits["U"]
+        edge_states_count = len(self.belief_codec.edge_states)
+        unknown_layers = self._belief_layers(edge_states=["F", "T", "U"], layer_edge_state="U", first_layer=1)
+        for unknown_layer in unknown_layers:
+            affected = np.zeros(shape=len(unknown_layer), dtype=bool)
+            for edge_idx in changed_edges:
+                edge_digits = (unknown_layer // self.belief_codec.edge_weights[edge_idx]) % edge_states_count
+                affected |= edge_digits == unknown_digit
+            affected_layer = unknown_layer[affected]
+            self.utility_values[:, affected_layer] = -np.inf
+            self.utility_values[self.goal_idx, affected_layer] = 0.0
+            yield affected_layer
+
+    def _special_edges_by_key(self):
+        return {
+            self.state.edge_key(current_vertex=special_edge["from"], next_vertex=special_edge["to"], mode="Coords"):
+                special_edge
+            for special_edge in self.state.special_edges
+        }
+
+    def apply_map_delta(self, added_edges: list = None, removed_edges: list = None):
+        # Adds and removes special edges (see State.apply_map_delta) and updates a solved table. The belief states
+        # dimension is reshaped: a removed fragile edge keeps the belief states where it had its new known state,
+        # an added one takes the previous belief states where it has the previous state of the edge (blocked or
+        # normal). Only the belief states a changed edge or a changed belief state they reveal can affect are
+        # solved again, starting from their previous values
+        previous_edges = self._special_edges_by_key()
+        previous_edges_keys = list(self.unknown_edges_keys)
+        previous_codec = self.belief_codec
+
+        self.state.apply_map_delta(added_edges=added_edges, removed_edges=removed_edges)
+        self.unknown_edges = [edge for edge in self.state.special_edges if edge["type"] == "fragile"]
+        self.unknown_edge_index = dict()
+        self.unknown_edges_keys = list()
+        self._build_unknown_edge_index()
+        self.belief_codec = BeliefCodec(edges_count=len(self.unknown_edges))
+        self.solver_stats.count(counter_name="map_deltas")
+
+        # Not solved yet, or solved on demand
+        if self.transition_model is None:
+            return
+        lazy_mode, rtdp_mode = self.lazy_solver is not None, self.rtdp_solver is not None
+        self._prepare_model()
+        if lazy_mode:
+            self._solve_lazy()
+            return
+        if rtdp_mode:
+            self._solve_rtdp(**self.rtdp_options)
+            return
+
+        # Edges that turned blocked or normal, added fragile edges with their previous state, and fragile edges
+        # whose probability changed
+        current_edges = self._special_edges_by_key()
+        closed_edges_keys, opened_edges_keys = list(), list()
+        for edge_key in sorted(set(previous_edges) | set(current_edges)):
+            previous_type = previous_edges[edge_key]["type"] if edge_key in previous_edges else "normal"
+            current_type = current_edges[edge_key]["type"] if edge_key in current_edges else "normal"
+            if previous_type == "normal" and current_type == "always blocked":
+                closed_edges_keys.append(edge_key)
+            elif previous_type == "always blocked" and current_type == "normal":
+                opened_edges_keys.append(edge_key)
+        added_fragile_edges, reweighted_edges = list(), list()
+        for edge_idx, edge_key in enumerate(self.unknown_edges_keys):
+            previous_edge = previous_edges.get(edge_key, None)
+            if previous_edge is None or previous_edge["type"] != "fragile":
+                added_fragile_edges.append((edge_idx, "F" if previous_edge is None else "T"))
+            elif previous_edge["p"] != self.unknown_edges[edge_idx]["p"]:
+                reweighted_edges.append(edge_idx)
+
+        # Previous belief state of every current one ('-1' where an added fragile edge is unknown)
+        belief_indices = np.arange(self.belief_codec.beliefs_count)
+        source_indices = np.zeros(shape=self.belief_codec.beliefs_count, dtype=np.int64)
+        new_beliefs = np.zeros(shape=self.belief_codec.beliefs_count, dtype=bool)
+        edge_state_digits = self.belief_codec.edge_state_digits
+        for edge_idx, edge_key in enumerate(self.unknown_edges_keys):
+            digits = (belief_indices // self.belief_codec.edge_weights[edge_idx]) % len(self.belief_codec.edge_states)
+            if edge_key in previous_edges_keys:
+                source_indices += digits * previous_codec.edge_weights[previous_edges_keys.index(edge_key)]
+            else:
+                new_beliefs |= digits == edge_state_digits["U"]
+        for previous_edge_idx, edge_key in enumerate(previous_edges_keys):
+            if edge_key not in self.unknown_edge_index:
+                current_digit = edge_state_digits["F" if edge_key not in current_edges else "T"]
+                source_indices += current_digit * previous_codec.edge_weights[previous_edge_idx]
+        self._reshape_tables(source_indices=np.where(new_beliefs, -1, source_indices))
+
+        engine_counters = self._engine_counters()
+        changed_beliefs = set()
+        belief_layers = self._belief_layers(edge_states=["F", "T", "U"], layer_edge_state="U")
+        with self.solver_stats.phase(phase_name="map_delta", total=self.belief_codec.beliefs_count):
+            for belief_layer in belief_layers:
+                for belief_idx in belief_layer.tolist():
+                    unknown_state = self.belief_codec.decode(belief_idx=belief_idx)
+                    belief_closed_keys, belief_opened_keys = list(closed_edges_keys), list(opened_edges_keys)
+                    seed_idx = belief_idx
+                    for edge_idx, previous_state in added_fragile_edges:
+                        edge_state = unknown_state[edge_idx]
+                        if edge_state == "U":
+                            seed_idx = self.belief_codec.replace_edge_state(
+                                belief_idx=seed_idx,
+                                edge_idx=edge_idx,
+                                edge_state="T"
                             )
+                        elif edge_state != previous_state:
+                            edge_keys = belief_closed_keys if edge_state == "T" else belief_opened_keys
+                            edge_keys.append(self.unknown_edges_keys[edge_idx])
+
+                    # New belief states start from the one with the added fragile edges blocked (a lower bound)
+                    if seed_idx != belief_idx:
+                        self.utility_values[:, belief_idx] = self.utility_values[:, seed_idx]
+                    resolve = seed_idx != belief_idx or any(unknown_state[edge_idx] == "U"
+                                                            for edge_idx in reweighted_edges)
+                    if resolve or self._belief_affected(
+                        belief_idx=belief_idx,
+                        unknown_state=unknown_state,
+                        closed_edges_keys=belief_closed_keys,
+                        opened_edges_keys=belief_opened_keys,
+                        changed_beliefs=changed_beliefs
+                    ):
+                        sweeps_count, belief_changed = self.backup_engine.repair_belief(belief_idx=belief_idx)
+                        self.solver_stats.belief_solved(belief_idx=belief_idx, sweeps_count=sweeps_count)
+                        self.solver_stats.count(counter_name="repaired_beliefs")
+                        if belief_changed or resolve:
+                            changed_beliefs.add(belief_idx)
+                    self.solver_stats.advance(phase_name="map_delta")
+                self._release_tables()
+            self._count_engine_work(engine_counters=engine_counters)
+
+    def _move_code(self, vertex_idx: int, next_vertex_idx: int):
+        location = self.state.vertex_index_to_coordinates(idx=vertex_idx)
+        next_location = self.state.vertex_index_to_coordinates(idx=next_vertex_idx)
+        return self.possible_moves.index([next_location[0] - location[0], next_location[1] - location[1]])
+
+    def _belief_affected(self,
+                         belief_idx: int,
+                         unknown_state: list,
+                         closed_edges_keys: list,
+                         opened_edges_keys: list,
+                         changed_beliefs: set):
+        # Whether the previous solution of a belief state may not hold: a belief state it reveals changed, a changed
+        # edge touches one of its unknown edges, a closed edge was the action of one of its ends, or an opened edge
+        # is as good as the value of one of its ends
+        unknown_endpoints = set()
+        for edge_idx, edge_state in enumerate(unknown_state):
+            if edge_state != "U":
+                continue
+            unknown_endpoints.update(self.unknown_edges_keys[edge_idx])
+            for revealed_edge_state in ["T", "F"]:
+                revealed_belief_idx = self.belief_codec.replace_edge_state(
+                    belief_idx=belief_idx,
+                    edge_idx=edge_idx,
+                    edge_state=revealed_edge_state
+                )
+                if revealed_belief_idx in changed_beliefs:
+                    return True
+
+        for first_vertex_idx, second_vertex_idx in closed_edges_keys + opened_edges_keys:
+            if first_vertex_idx in unknown_endpoints or second_vertex_idx in unknown_endpoints:
+                return True
+
+        # Other optimal moves keep both the values and the sweep tie breaking
+        for first_vertex_idx, second_vertex_idx in closed_edges_keys:
+            first_action_code, second_action_code = self.utility_actions.fetch(
+                vertex_indices=[first_vertex_idx, second_vertex_idx],
+                belief_indices=belief_idx
+            )
+            if first_action_code == self._move_code(vertex_idx=first_vertex_idx, next_vertex_idx=second_vertex_idx):
+                return True
+            if second_action_code == self._move_code(vertex_idx=second_vertex_idx, next_vertex_idx=first_vertex_idx):
+                return True
+
+        # Unit costs
+        for first_vertex_idx, second_vertex_idx in opened_edges_keys:
+            first_value = self.utility_values[first_vertex_idx, belief_idx]
+            second_value = self.utility_values[second_vertex_idx, belief_idx]
+            if np.isfinite(second_value) and second_value - 1 >= first_value:
+                return True
+            if np.isfinite(first_value) and first_value - 1 >= second_value:
+                return True
+        return False
+
+    def _reshape_tables(self, source_indices: np.ndarray):
+        # New tables for the current belief states, each column copied from its previous belief state
+        # ('source_indices', '-1' keeps the initial values). Disk tables are moved aside while they are read
+        previous_values = self.utility_values
+        previous_actions = self.utility_actions
+        previous_disk_tables = list(self.disk_tables.values())
+        for disk_table in previous_disk_tables:
+            previous_path = f"{disk_table.path}.previous"
+            os.replace(disk_table.path, previous_path)
+            disk_table.path = previous_path
+
+        self._set_initial_values()
+        self.backup_engine = BackupEngine(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            utility_values=self.utility_values,
+            utility_actions=self.utility_actions
+        )
 
-                        # If the edge state is unknown, calculate the new value based on the probabilities
-                        elif edge_state == "U":
-                            ###################
-                            # Edge is blocked #
-                            ###################
-                            unknown_state_t = deepcopy(unknown_state)
-                            unknown_state_t[edge_idx] = "T"
-                            alternative_new_locations = self._find_alternative_new_locations(
-                                current_location=current_location,
-                                current_move=possible_move,
-                                unknown_state=unknown_state_t
-                            )
+        # Action codes are copied a few belief states at a time (every vertex of each)
+        vertex_indices = np.arange(self.state.total_vertices)
+        chunk_size = max(self.table_chunk_size // self.state.total_vertices, 1)
+        for chunk_start in range(0, self.belief_codec.beliefs_count, chunk_size):
+            belief_indices = np.arange(chunk_start, min(chunk_start + chunk_size, self.belief_codec.beliefs_count))
+            copied_indices = belief_indices[source_indices[belief_indices] >= 0]
+            copied_sources = source_indices[copied_indices]
+            self.utility_values[:, copied_indices] = previous_values[:, copied_sources]
+            self.utility_actions.store(
+                vertex_indices=vertex_indices[None, :],
+                belief_indices=copied_indices[:, None],
+                action_codes=previous_actions.fetch(
+                    vertex_indices=vertex_indices[None, :],
+                    belief_indices=copied_sources[:, None]
+                )
+            )
+            self._release_tables()
+            for disk_table in previous_disk_tables:
+                disk_table.release()
 
-                            # If there are no alternative new locations, continue to the next move
-                            if len(alternative_new_locations) == 0:
-                                continue
-                            # If there are alternative new locations, calculate the new value based on the maximum value
-                            else:
-                                min_path_cost = -np.inf
-                                for alternative_new_location in alternative_new_locations:
-                                    alternative_location_value, _ = (
-                                        self.states_utilities[str(alternative_new_location)].utility_value_and_action(
-                                            unknown_state=unknown_state_t
-                                        )
-                                    )
-                                    min_path_cost = max(min_path_cost, alternative_location_value)
-                                next_location_value_t = min_path_cost
-
-                            #####################
-                            # Edge is unblocked #
-                            #####################
-                            unknown_state_f = deepcopy(unknown_state)
-                            unknown_state_f[edge_idx] = "F"
-                            next_location_value_f, _ = (
-                                self.states_utilities[str(new_location)].utility_value_and_action(
-                                    unknown_state=unknown_state_f
-                                )
-                            )
+        for disk_table in previous_disk_tables:
+            os.remove(disk_table.path)
 
-                            p = self.unknown_edges[edge_idx]["p"]
-                            q = 1 - p
-                            next_location_value = p * next_location_value_t + q * next_location_value_f
-                        else:
-                            raise Exception("Unknown edge state")
-
-                        new_value = (-edge_cost) + next_location_value
-                        action = self.state.get_action_name(
-                            current_vertex=current_location,
-                            next_vertex=new_location,
-                            mode="Coords"
-                        )
-                        update_result = state_utility.update_utility_value(
-                            unknown_state=unknown_state,
-                            value=new_value,
-                            action=action
-                        )
-                        if update_result:
-                            success_update = True
-                    else:
-                        continue
-
-    def preform_value_iteration(self):
+    def _prepare_model(self):
         goal_location = self.all_packages[0]["deliver_to"]
+        self.goal_idx = self.state.coordinates_to_vertex_index(coords=goal_location)
+        with self.solver_stats.phase(phase_name="model_compilation"):
+            self.transition_model = self.compile_transition_model()
+        self.lazy_solver = None
+        self.rtdp_solver = None
+
+    def solution_header(self):
+        # Everything the stored tables layout depends on
+        return {
+            "format_version": 2,
+            "vertices_count": self.state.total_vertices,
+            "edge_states": self.belief_codec.edge_states,
+            "fragile_edges": [unknown_edge["identifier"] for unknown_edge in self.unknown_edges],
+            "goal_idx": self.state.coordinates_to_vertex_index(coords=self.all_packages[0]["deliver_to"]),
+            "action_names": self.action_names
+        }
+
+    def save_solution(self, solution_store: SolutionStore, environment_key: str):
+        if self.utility_values is None:
+            raise ValueError("Only a solved utility table can be saved")
+
+        solution_store.save(
+            environment_key=environment_key,
+            header=self.solution_header(),
+            utility_values=self.utility_values,
+            action_codes=self.utility_actions.codes
+        )
 
-        # Set initial values
-        self._set_initial_values(goal_location=goal_location)
-
-        # Get all possible known states
-        known_states = itertools.product(["F", "T"], repeat=len(self.unknown_edges))
-        known_states = [list(known_state) for known_state in known_states]
-
-        # Update utilities under known states
-        for known_state in tqdm(known_states):
-            self._update_utilities_under_unknown_state(unknown_state=known_state)
-
-        # Get all possible unknown states
-        unknown_states = itertools.product(["F", "T", "U"], repeat=len(self.unknown_edges))
-        unknown_states = [list(unknown_state) for unknown_state in unknown_states if "U" in unknown_state]
-        unknown_states.sort(key=lambda x: x.count("U"))
-
-        # Update utilities under unknown states
-        for unknown_state in tqdm(unknown_states):
-            self._update_utilities_under_unknown_state(unknown_state=unknown_state)
+    def load_solution(self, solution_store: SolutionStore, environment_key: str):
+        # Maps a stored solution instead of solving, returns whether there was a matching one
+        header = solution_store.read_header(environment_key=environment_key)
+        if header is None:
+            return False
+        if any(header.get(key, None) != value for key, value in self.solution_header().items()):
+            return False
+
+        self._prepare_model()
+        self.utility_values, action_codes = solution_store.load(environment_key=environment_key, header=header)
+        self.utility_actions = ActionTable(
+            vertices_count=self.state.total_vertices,
+            belief_codec=self.belief_codec,
+            edge_endpoints=self.unknown_edges_keys,
+            codes=action_codes
+        )
+        self._build_states_utilities()
+        self.backup_engine = BackupEngine(
+            transition_model=self.transition_model,
+            goal_idx=self.goal_idx,
+            belief_codec=self.belief_codec,
+            utility_values=self.utility_values,
+            utility_actions=self.utility_actions
+        )
+        return True
+
+    def _solver_value_and_action(self, vertex_idx: int, belief_idx: int):
+        # Pairs answered by the rtdp policy or solved by the lazy solver
+        if self.rtdp_solver is not None:
+            return self.rtdp_solver.value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        return self._lazy_value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)
+
+    def _lazy_value_and_action(self, vertex_idx: int, belief_idx: int):
+        settled_count = self.lazy_solver.settled_count
+        value, action_code = self.lazy_solver.value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        self.solver_stats.count(
+            counter_name="lazy_settled_vertices",
+            amount=self.lazy_solver.settled_count - settled_count
+        )
+        return value, action_code
+
+    def policy_action_codes(self, vertex_indices: np.ndarray, belief_indices: np.ndarray):
+        # Action codes of many (vertex, belief state) pairs at once ('-1' where there is no action)
+        self.solver_stats.count(counter_name="belief_table_lookups", amount=len(vertex_indices))
+        if self.lazy_solver is None and self.rtdp_solver is None:
+            return self.utility_actions.fetch(vertex_indices=vertex_indices, belief_indices=belief_indices)
+
+        return np.array([
+            self._solver_value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)[1]
+            for vertex_idx, belief_idx in zip(vertex_indices.tolist(), belief_indices.tolist())
+        ], dtype=np.int8)
+
+    def utility_value_and_action(self, vertex_idx: int, unknown_state: list):
+        # Lookup backend of the reports and the policy: the solved table, the lazy solver on demand or the rtdp policy
+        self.solver_stats.count(counter_name="belief_table_lookups")
+        if self.lazy_solver is None and self.rtdp_solver is None:
+            return self.states_utilities[vertex_idx].utility_value_and_action(unknown_state=unknown_state)
+
+        belief_idx = self.belief_codec.first_matching_index(unknown_state=unknown_state)
+        value, action_code = self._solver_value_and_action(vertex_idx=vertex_idx, belief_idx=belief_idx)
+        action = None if action_code < 0 else self.action_names[action_code]
+        return value, action
+
+    def _is_observation_consistent(self, vertex_idx: int, unknown_state: list):
+        return all(unknown_state[edge_idx] != "U" for edge_idx in self.incident_unknown_edges.get(vertex_idx, list()))
+
+    def _belief_state_line(self, vertex: list, vertex_idx: int, unknown_state: list):
+        value, action = self.utility_value_and_action(vertex_idx=vertex_idx, unknown_state=unknown_state)
+        if not self._is_observation_consistent(vertex_idx=vertex_idx, unknown_state=unknown_state):
+            # No action is stored: standing here would have revealed the unknown incident edges
+            action = "inconsistent (unknown incident edge)"
+        action = "unreachable" if action is None else action
+        belief_state_line = f"  U{str(unknown_state)}={value}, Optimal Action: {action}"
+
+        if action in ["Up", "Down", "Left", "Right"]:
+            movement = self.state.convert_action_to_movement(action=action)
+            next_location = (vertex[0] + movement[0], vertex[1] + movement[1])
+            belief_state_line += f" (To '{next_location}')\n"
+        else:
+            belief_state_line += f"\n"
+        return belief_state_line
+
+    def _reachable_belief_indices(self):
+        # Vertex index -> belief states the policy can be in at that vertex, starting from the package location,
+        # over every graph instance with a positive probability
+        start_idx = self.state.coordinates_to_vertex_index(coords=self.all_packages[0]["package_at"])
+        initial_belief_idx = self.belief_codec.encode(unknown_state=self.get_initial_unknown_state())
+        reachable_belief_indices = dict()
+        visited_pairs = {(start_idx, initial_belief_idx)}
+        pending_pairs = [(start_idx, initial_belief_idx)]
+        while len(pending_pairs) > 0:
+            vertex_idx, belief_idx = pending_pairs.pop()
+
+            # Every outcome of revealing the unknown incident edges
+            unknown_edge_indices = [
+                edge_idx for edge_idx in self.incident_unknown_edges.get(vertex_idx, list())
+                if self.belief_codec.edge_state(belief_idx=belief_idx, edge_idx=edge_idx) == "U"
+            ]
+            for revealed_states in itertools.product(["T", "F"], repeat=len(unknown_edge_indices)):
+                revealed_belief_idx = belief_idx
+                possible = True
+                for edge_idx, edge_state in zip(unknown_edge_indices, revealed_states):
+                    blocked_probability = self.transition_model.fragile_probabilities[edge_idx]
+                    possible &= bool(blocked_probability > 0 if edge_state == "T" else blocked_probability < 1)
+                    revealed_belief_idx = self.belief_codec.replace_edge_state(
+                        belief_idx=revealed_belief_idx,
+                        edge_idx=edge_idx,
+                        edge_state=edge_state
+                    )
+                if not possible:
+                    continue
 
-    def belief_states_values(self):
-        belief_states_str = "Belief States Values:\n"
+                reachable_belief_indices.setdefault(vertex_idx, set()).add(revealed_belief_idx)
+                if vertex_idx == self.goal_idx:
+                    continue
 
-        # Get all belief states
-        unknown_states = itertools.product(["F", "T", "U"], repeat=len(self.unknown_edges))
-        unknown_states = [list(unknown_state) for unknown_state in unknown_states]
+                _, action = self.utility_value_and_action(
+                    vertex_idx=vertex_idx,
+                    unknown_state=self.belief_codec.decode(belief_idx=revealed_belief_idx)
+                )
+                if action is None:
+                    continue
 
-        # # Filter belief states with unknown edges
-        # unknown_states = [list(unknown_state) for unknown_state in unknown_states if "U" in unknown_state]
-        # unknown_states.sort(key=lambda x: x.count("U"))
+                next_pair = (
+                    int(self.transition_model.successors[vertex_idx, self.action_names.index(action)]),
+                    revealed_belief_idx
+                )
+                if next_pair not in visited_pairs:
+                    visited_pairs.add(next_pair)
+                    pending_pairs.append(next_pair)
+
+        return reachable_belief_indices
+
+    def _report_ordered(self, belief_indices: np.ndarray, report_edge_states: list):
+        # Belief state indices sorted in the report order of the edge states (first edge most significant)
+        report_digits = np.array([report_edge_states.index(edge_state) for edge_state in self.belief_codec.edge_states])
+        report_keys = np.zeros_like(belief_indices)
+        for edge_weight in self.belief_codec.edge_weights:
+            edge_digits = (belief_indices // edge_weight) % len(self.belief_codec.edge_states)
+            report_keys = report_keys * len(report_edge_states) + report_digits[edge_digits]
+        return belief_indices[np.argsort(report_keys, kind="stable")]
+
+    def belief_states_lines(self, location: list = None, belief_pattern: list = None, reachable_only: bool = False):
+        # The belief states values report, one line at a time. Optional filters: a single location, belief states
+        # matching a pattern ('X' any edge state, 'K' a known edge state), the belief states the policy reaches
+        yield "Belief States Values:\n"
+
+        report_edge_states = ["F", "T", "U"]
+        if reachable_only:
+            reachable_belief_indices = self._reachable_belief_indices()
+
+        # A pattern is expanded once into the indices it matches, the other belief states are never visited
+        matching_belief_indices = None
+        if belief_pattern is not None:
+            matching_belief_indices = self._report_ordered(
+                belief_indices=self.belief_codec.matching_indices(unknown_state=belief_pattern),
+                report_edge_states=report_edge_states
+            )
 
         # Loop over all vertices
         X = self.state.X
         Y = self.state.Y
         all_vertices = [list(vertex) for vertex in itertools.product(range(X), range(Y))]
+        if location is not None:
+            all_vertices = [list(location)]
         for vertex in all_vertices:
-            belief_states_str += "\n"
-            belief_states_str += f"Vertex {tuple(vertex)}:\n"
-            for unknown_state in unknown_states:
-                value, action = self.states_utilities[str(vertex)].utility_value_and_action(
-                    unknown_state=unknown_state
+            vertex_idx = self.state.coordinates_to_vertex_index(coords=vertex)
+            # Only the belief states of the filters (all of them in the report order when there is no filter)
+            belief_indices = matching_belief_indices
+            if reachable_only:
+                reachable_indices = np.array(sorted(reachable_belief_indices.get(vertex_idx, set())), dtype=np.int64)
+                if matching_belief_indices is not None:
+                    reachable_indices = reachable_indices[np.isin(reachable_indices, matching_belief_indices)]
+                belief_indices = self._report_ordered(
+                    belief_indices=reachable_indices,
+                    report_edge_states=report_edge_states
+                )
+            if belief_indices is None:
+                unknown_states = (
+                    list(unknown_state)
+                    for unknown_state in itertools.product(report_edge_states, repeat=len(self.unknown_edges))
+                )
+            else:
+                unknown_states = (
+                    self.belief_codec.decode(belief_idx=belief_idx) for belief_idx in belief_indices.tolist()
                 )
-                action = "unreachable" if action is None else action
-                belief_states_str += f"  U{str(unknown_state)}={value}, Optimal Action: {action}"
 
-                if action in ["Up", "Down", "Left", "Right"]:
-                    movement = self.state.convert_action_to_movement(action=action)
-                    next_location = (vertex[0] + movement[0], vertex[1] + movement[1])
-                    belief_states_str += f" (To '{next_location}')\n"
-                else:
-                    belief_states_str += f"\n"
+            # The vertex header comes with its first belief state
+            header_pending = True
+            for unknown_state in unknown_states:
+                if header_pending:
+                    yield f"\nVertex {tuple(vertex)}:\n"
+                    header_pending = False
+                yield self._belief_state_line(vertex=vertex, vertex_idx=vertex_idx, unknown_state=unknown_state)
+
+    @staticmethod
+    def _write_lines(output_file, lines, chunk_lines: int):
+        # Streams lines into a text file object, 'chunk_lines' lines per write
+        lines_chunk = list()
+        for line in lines:
+            lines_chunk.append(line)
+            if len(lines_chunk) == chunk_lines:
+                output_file.write("".join(lines_chunk))
+                lines_chunk.clear()
+        output_file.write("".join(lines_chunk))
+
+    def write_belief_states_values(self, output_file, chunk_lines: int = 4096, **report_filters):
+        self._write_lines(
+            output_file=output_file,
+            lines=self.belief_states_lines(**report_filters),
+            chunk_lines=chunk_lines
+        )
 
-        return belief_states_str
+    def belief_states_values(self, **report_filters):
+        return "".join(self.belief_states_lines(**report_filters))
 
     def get_initial_unknown_state(self):
         unknown_state = ["U"] * len(self.unknown_edges)
         return unknown_state
 
-    def _scan_closest_fragile_edges(self, current_location: list, unknown_state: list):
-        scanned_unknown_state = deepcopy(unknown_state)
-        closest_not_scanned_edges_indices = list()
-
-        # No unknown edges
-        if scanned_unknown_state.count("U") == 0:
-            return closest_not_scanned_edges_indices, scanned_unknown_state
+    def policy_lines(self, policy_format: str = "text"):
+        # The policy graph serialized one line at a time ('text' or 'json')
+        if policy_format not in ["text", "json"]:
+            raise ValueError(f"Invalid policy format: {policy_format}")
 
-        for edge_idx, edge in enumerate(self.unknown_edges):
-            if scanned_unknown_state[edge_idx] != "U":
-                continue
-
-            if edge["from"] == current_location:
-                closest_not_scanned_edges_indices.append(edge_idx)
-                scanned_unknown_state[edge_idx] = "K"
-            elif edge["to"] == current_location:
-                closest_not_scanned_edges_indices.append(edge_idx)
-                scanned_unknown_state[edge_idx] = "K"
+        with self.solver_stats.phase(phase_name="policy_extraction"):
+            policy_graph = PolicyGraph(utility_of_states=self)
+            self.solver_stats.count(counter_name="policy_nodes", amount=len(policy_graph.nodes))
+            if policy_format == "text":
+                yield from policy_graph.text_lines()
             else:
-                continue
-        return closest_not_scanned_edges_indices, scanned_unknown_state
-
-    def _find_policy_recursive(self,
-                               current_location: list,
-                               goal_location: list,
-                               unknown_state: list,
-                               bulk_format: str,
-                               path_cost: int,
-                               policy_str: str):
-        if current_location == goal_location:
-            policy_str += f"{bulk_format} Action: 'no-op', Path cost: {path_cost} (Goal reached)\n"
-        else:
-            closest_not_scanned_edges_indices, unknown_state = self._scan_closest_fragile_edges(
-                current_location=current_location,
-                unknown_state=unknown_state
-            )
-            if len(closest_not_scanned_edges_indices) == 0:
-                state_utility = self.states_utilities[str(current_location)]
-                expected_value, action = state_utility.utility_value_and_action(unknown_state=unknown_state)
-                if action is None:
-                    policy_str += (
-                        f"{bulk_format} Action: 'no-op', Path cost: -inf "
-                        f"(Goal might be unreachable and it's best to stop)\n"
-                    )
-                else:
-                    move = self.state.convert_action_to_movement(action=action)
-                    next_location = [current_location[0] + move[0], current_location[1] + move[1]]
-
-                    from_coords = f"({current_location[0]},{current_location[1]})"
-                    to_coords = f"({next_location[0]},{next_location[1]})"
-                    policy_str += f"{bulk_format} Action: '{action}' (From '{from_coords}' to '{to_coords}')\n"
-
-                    policy_str = self._find_policy_recursive(
-                        current_location=next_location,
-                        goal_location=goal_location,
-                        unknown_state=unknown_state,
-                        bulk_format=bulk_format,
-                        path_cost=path_cost-1,
-                        policy_str=policy_str
-                    )
-            else:
-                edges_states_combinations = itertools.product(["F", "T"], repeat=len(closest_not_scanned_edges_indices))
-                edges_states_combinations = [list(combination) for combination in edges_states_combinations]
-
-                for combination in edges_states_combinations:
-                    policy_str += f"{bulk_format} If ("
-                    combination_unknown_state = deepcopy(unknown_state)
-                    separator = ""
-                    for idx, edge_idx in enumerate(closest_not_scanned_edges_indices):
-                        edge = self.unknown_edges[edge_idx]
-                        edge_identifier = edge["identifier"]
-                        policy_str += f"{separator}Blocked['{edge_identifier}']={combination[idx]}"
-                        separator = " and "
-                        combination_unknown_state[edge_idx] = combination[idx]
-                    policy_str += "):\n"
-
-                    policy_str = self._find_policy_recursive(
-                        current_location=current_location,
-                        goal_location=goal_location,
-                        unknown_state=combination_unknown_state,
-                        bulk_format=f"{bulk_format}{self.policy_bulk}",
-                        path_cost=path_cost,
-                        policy_str=policy_str
-                    )
+                yield from policy_graph.json_lines()
 
-        return policy_str
-
-    def find_policy(self):
-        policy_str = "The Constructed Policy:\n\n"
-
-        start_location = self.all_packages[0]["package_at"]
-        goal_location = self.all_packages[0]["deliver_to"]
-        unknown_state = self.get_initial_unknown_state()
-        path_cost = 0
-
-        policy_str = self._find_policy_recursive(
-            current_location=deepcopy(start_location),
-            goal_location=goal_location,
-            unknown_state=deepcopy(unknown_state),
-            bulk_format=self.policy_bulk,
-            path_cost=path_cost,
-            policy_str=policy_str
+    def write_policy(self, output_file, policy_format: str = "text", chunk_lines: int = 4096):
+        self._write_lines(
+            output_file=output_file,
+            lines=self.policy_lines(policy_format=policy_format),
+            chunk_lines=chunk_lines
         )
 
-        state_utility = self.states_utilities[str(start_location)]
-        expected_value, action = state_utility.utility_value_and_action(unknown_state=unknown_state)
-        policy_str += f"Policy Expected Utility: {expected_value}\n"
-
-        return policy_str
+    def find_policy(self):
+        return "".join(self.policy_lines())
 
     def _scan_closest_unknown_edges(self, state: State, unknown_state: list):
         # No unknown edges
@@ -389,26 +946,18 @@ class UtilityOfStates:
             return unknown_state
 
         agent_location = state.agents[0]["location"]
-        for edge_idx, edge in enumerate(self.unknown_edges):
+        agent_vertex_idx = self.state.coordinates_to_vertex_index(coords=agent_location)
+        for edge_idx in self.incident_unknown_edges.get(agent_vertex_idx, list()):
             # Skip known edges
             if unknown_state[edge_idx] != "U":
                 continue
 
-            if edge["from"] == agent_location:
-                edge_type, _ = state.get_edge_type_and_cost(
-                    current_vertex=agent_location,
-                    next_vertex=edge["to"],
-                    mode="Coords"
-                )
-            elif edge["to"] == agent_location:
-                edge_type, _ = state.get_edge_type_and_cost(
-                    current_vertex=agent_location,
-                    next_vertex=edge["from"],
-                    mode="Coords"
-                )
-            else:
-                continue
-
+            first_vertex_idx, second_vertex_idx = self.unknown_edges_keys[edge_idx]
+            edge_type, _ = state.get_edge_type_and_cost(
+                current_vertex=first_vertex_idx,
+                next_vertex=second_vertex_idx,
+                mode="Indices"
+            )
             if edge_type == "always blocked":
                 unknown_state[edge_idx] = "T"
             else:
@@ -420,7 +969,7 @@ class UtilityOfStates:
         unknown_state = self._scan_closest_unknown_edges(state=state, unknown_state=unknown_state)
 
         agent_location = state.agents[0]["location"]
-        state_utility = self.states_utilities[str(agent_location)]
-        _, action = state_utility.utility_value_and_action(unknown_state=unknown_state)
+        agent_vertex_idx = self.state.coordinates_to_vertex_index(coords=agent_location)
+        _, action = self.utility_value_and_action(vertex_idx=agent_vertex_idx, unknown_state=unknown_state)
 
         return action, unknown_state
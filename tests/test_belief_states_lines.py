@@ -0,0 +1,63 @@
+import os
+import ast
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from state import State
+from ascii_parser import Parser
+from utility_of_states import UtilityOfStates
+
+
+def _solved_utility_of_states():
+    data_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "input", "input3.txt")
+    initial_state = State(environment_data=Parser().parse_data(data_filepath=data_filepath))
+    initial_state.update_agent_packages_status()
+    utility_of_states = UtilityOfStates(initial_state=initial_state, show_progress=False)
+    utility_of_states.preform_value_iteration()
+    return utility_of_states
+
+
+def _count_matches_pattern_calls(utility_of_states: UtilityOfStates):
+    # Counts the calls of the per belief state pattern test
+    calls = list()
+    matches_pattern = utility_of_states.belief_codec.matches_pattern
+
+    def counted_matches_pattern(**kwargs):
+        calls.append(kwargs)
+        return matches_pattern(**kwargs)
+
+    utility_of_states.belief_codec.matches_pattern = counted_matches_pattern
+    return calls
+
+
+def test_filtered_query_does_not_test_every_belief():
+    utility_of_states = _solved_utility_of_states()
+    calls = _count_matches_pattern_calls(utility_of_states=utility_of_states)
+    belief_pattern = ["U", "K", "X", "X", "F"]
+
+    # The pattern is expanded into its matching indices, no belief state is tested against it
+    lines = list(utility_of_states.belief_states_lines(location=[0, 1], belief_pattern=belief_pattern))
+    assert len(calls) == 0
+
+    # Same lines as the full report of the vertex filtered by the pattern
+    expected_lines = [
+        line for line in utility_of_states.belief_states_lines(location=[0, 1])
+        if not line.startswith("  U") or utility_of_states.belief_codec.matches_pattern(
+            unknown_state=ast.literal_eval(line[3:line.index("]") + 1]),
+            pattern=belief_pattern
+        )
+    ]
+    assert lines == expected_lines
+    assert len(lines) == 2 + 1 * 2 * 3 * 3 * 1
+
+
+def test_filtered_reachable_query_matches_the_reachable_report():
+    utility_of_states = _solved_utility_of_states()
+    belief_pattern = ["K", "X", "X", "X", "X"]
+
+    lines = list(utility_of_states.belief_states_lines(belief_pattern=belief_pattern, reachable_only=True))
+    reachable_lines = list(utility_of_states.belief_states_lines(reachable_only=True))
+    assert [line for line in lines if line.startswith("  U")] == [
+        line for line in reachable_lines if line.startswith("  U") and not line.startswith("  U['U'")
+    ]